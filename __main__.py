@@ -3,7 +3,7 @@
 ''' bF/bL/bC interpreter; author: nzt4567; year: 2012/2013 '''
 
 # IMPORTS
-import std, brainx
+import std, sys, daemon # the rest only when the run is not forwarded
 
 # CREDITS
 __author__  = std.__author__
@@ -15,15 +15,71 @@ __year__    = std.__year__
 
 ################################# MAIN ##################################
 def main():
-  ''' Run the program '''
+  ''' Run the program (in the daemon on $BF_DAEMON if there is one) '''
 
+  code = daemon.forward(sys.argv)
+  if code is not None:
+    sys.exit(code)
+  run()
+
+def run():
+  ''' Run the program in this process '''
+
+  import brainx, sink, reader, tape, cache, batch, bench, server, \
+         snapshot, lockstep
   a = std.pa()
-  if a['type'] == 'F':
-    brainx.BrainFuck(a['source'])
-  elif a['type'] == 'L':
-    brainx.BrainLoller(a['source'])
-  else:
-    brainx.BrainCopter(a['source'])
+  if a['daemon']:
+    sys.exit(daemon.main(a, run))
+  if a['batch']:
+    sys.exit(1 if batch.main(a) else 0)
+  if a['bench']:
+    sys.exit(1 if bench.main(a) else 0)
+  if a['connect']:
+    sys.exit(server.client(a['connect']))
+  if a['serve']:
+    sys.exit(server.main(a))
+  if a['inputs']:
+    sys.exit(1 if lockstep.main(a) else 0)
+  try:
+    out = sink.Sink(a['sink'], a['flush'], a['buffer'])
+    inp = reader.Reader(a['input'], a['eof'], out_=out)
+    mem = tape.create(a['tape'], left_=a['left'], path_=a['tape_file'])
+    c = None
+    if a['cache'] and not a['no_cache']:
+      c = cache.Cache(a['cache'], a['cache_limit'], a['rebuild_cache'])
+    if daemon.warm is not None and not a['no_cache']: # run by a worker
+      c = daemon.warm.over(c, a['rebuild_cache'])
+    point = None
+    if a['checkpoint']:
+      point = snapshot.Checkpoint(a['checkpoint'], a['checkpoint_steps'], \
+                                  a['checkpoint_interval'])
+    resume = snapshot.load(a['resume']) if a['resume'] else None
+  except (ValueError, OSError) as e:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", e))
+  o = { 'engine': a['engine'], 'level': a['optimize'], 'report': a['report'],
+        'out': out, 'inp': inp, 'memory': mem, 'cache': c,
+        'step_limit': a['max_steps'], 'time_limit': a['timeout'],
+        'tape_limit': a['max_tape'], 'profile': a['profile'],
+        'profile_json': a['profile_json'], 'checkpoint': point,
+        'resume': resume, 'prefix': a['prefix'],
+        'threshold': a['tier_threshold'], 'memo_window': a['memo'],
+        'memo_entries': a['memo_entries'] }
+  try:
+    if a['type'] == 'F':
+      brainx.BrainFuck(a['source'], **o)
+    elif a['type'] == 'L':
+      brainx.BrainLoller(a['source'], **o)
+    else:
+      brainx.BrainCopter(a['source'], **o)
+  finally:
+    inp.close()
+    mem.close()
+    if c is not None:
+      c.close()
+      if a['cache_stats']:
+        print('cache: ' + ', '.join('{0} {1}'.format(f, r) for f, r in \
+          c.lookups) + '; ' + ', '.join('{0}={1}'.format(k, v) for k, v \
+          in sorted(c.stats().items())), file=sys.stderr)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
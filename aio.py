@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Asyncio execution of BrainFuck bytecode
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  The bytecode interpreter runs in slices: it raises bytecode.Suspend when
+  , finds no input yet and every SLICE instructions (at loop back edges),
+  the run then awaits input from an asyncio stream (or just lets other
+  tasks run) and continues where it stopped. Output written by . is sent
+  to the stream whenever the run is suspended and when it ends.
+'''
+
+# IMPORTS
+import std, asyncio, bytecode, reader
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+SLICE = 10000 # instructions executed before other tasks get to run
+
+################################# INPUT #################################
+class Input(reader.Reader):
+  ''' Reader fed by the event loop, read suspends the run instead of
+      blocking when the input it needs has not arrived yet '''
+
+  def __init__(self, eof_='keep'):
+    reader.Reader.__init__(self, None, eof_)
+    self.queue = bytearray() # received, not in the buffer yet
+    self.closed = False # the other side will send nothing more
+
+  def feed(self, data_):
+    ''' Add data_ received from the stream (empty at EOF) '''
+
+    if data_:
+      self.queue += data_
+    else:
+      self.closed = True
+
+  def fill(self):
+    ''' Move received data into the buffer, return False at EOF '''
+
+    if self.embedded or not self.queue:
+      self.done = True
+      return False
+    self.buf = memoryview(bytes(self.queue))
+    self.pos = 0
+    self.queue = bytearray()
+    return True
+
+  def read(self, n_, v_):
+    ''' Execute , instruction(s), raise bytecode.Suspend if the input is
+        not there yet (nothing consumed, the instruction runs again) '''
+
+    if not (self.embedded or self.done or self.closed) and \
+       len(self.buf) - self.pos + len(self.queue) < n_:
+      raise bytecode.Suspend('input')
+    return reader.Reader.read(self, n_, v_)
+
+################################ OUTPUT #################################
+class Output():
+  ''' Sink collecting output until the run is suspended '''
+
+  def __init__(self):
+    self.buf = list() # chunks not sent yet
+    self.sent = 0 # bytes sent so far
+
+  def write(self, s_):
+    ''' Execute . instruction(s) '''
+
+    self.buf.append(s_)
+
+  async def send(self, stream_):
+    ''' Write collected output to asyncio stream_ '''
+
+    if not self.buf:
+      return
+    data = ''.join(self.buf).encode('latin-1')
+    self.buf = list()
+    self.sent += len(data)
+    stream_.write(data)
+    await stream_.drain()
+
+############################### EXECUTION ###############################
+def slicer(check_, slice_):
+  ''' Return limits check (see bytecode.budget) calling check_ that also
+      suspends the run every slice_ instructions '''
+
+  mark = slice_ # instructions executed when the run is suspended next
+
+  def check(n_):
+    ''' Raise LimitError or Suspend or return when to be called next '''
+
+    nonlocal mark
+    due = check_(n_)
+    if n_ >= mark:
+      mark = n_ + slice_
+      raise bytecode.Suspend('slice')
+    return min(due, mark)
+
+  return check
+
+async def execute(code_, tape_, in_, out_, reader_, writer_, check_=None, \
+                  slice_=SLICE):
+  ''' Run Bytecode code_ on tape.Tape tape_, in_ (Input) is fed from
+      asyncio stream reader_, output collected by out_ (Output) is sent to
+      writer_; return number of instructions executed '''
+
+  check = slicer(check_ if check_ is not None else bytecode.budget(), slice_)
+  ip = n = 0 # where the run continues
+  while 1:
+    try:
+      n = bytecode.execute(code_, tape_, out_, in_, check, ip, n)
+      break
+    except bytecode.Suspend as e:
+      ip, n = e.ip, e.steps
+      await out_.send(writer_)
+      if e.reason == 'input':
+        in_.feed(await reader_.read(reader.BUFSIZE))
+      else:
+        await asyncio.sleep(0)
+
+  await out_.send(writer_)
+  return n
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "AIO can only be imported, not run!")
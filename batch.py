@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Batch runner for corpora of BrainFuck/BrainLoller/BrainCopter programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Programs are given as files, directories (searched recursively for
+  SUFFIXES) and manifests (@file, one "path [F|L|C]" per line, paths
+  relative to the manifest). They run in a pool of worker processes, a
+  failing program (std.exit_failure exits the process) does not stop the
+  others. For every program one JSON line is printed (in the order of the
+  sources): path, type, error (name from std.EXIT_CODES or exception class,
+  null on success), exit code, message, sha256 of the output, output
+  length, instructions executed (null if the engine does not count them)
+  and wall time in seconds.
+'''
+
+# IMPORTS
+import std, os, io, json, time, hashlib, contextlib, \
+       concurrent.futures, brainx, sink, reader, tape, cache
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+SUFFIXES = { '.b': 'F', '.bf': 'F', '.png': None } # None means type from -t
+TYPES = { 'F': brainx.BrainFuck, 'L': brainx.BrainLoller,
+          'C': brainx.BrainCopter }
+NAMES = dict((v, k) for k, v in std.EXIT_CODES.items()) # exit code -> name
+
+############################## COLLECTING ###############################
+def collect(sources_, type_='F'):
+  ''' Return list of (path, type) of all programs in sources_, images are
+      of type_ if it is L or C (BrainLoller otherwise) '''
+
+  image = type_ if type_ in ('L', 'C') else 'L'
+  ret = list()
+  for s in sources_:
+    if s.startswith('@'): # manifest
+      ret += manifest(s[1:], type_)
+    elif os.path.isdir(s):
+      for d, dirs, files in os.walk(s):
+        dirs.sort()
+        for f in sorted(files):
+          t = SUFFIXES.get(os.path.splitext(f)[1].lower(), False)
+          if t is not False:
+            ret.append((os.path.join(d, f), t or image))
+    else:
+      t = SUFFIXES.get(os.path.splitext(s)[1].lower(), type_)
+      ret.append((s, image if t is None else t))
+  return ret
+
+def manifest(path_, type_):
+  ''' Return list of (path, type) of programs listed in file path_ '''
+
+  ret = list()
+  with open(path_, 'r', encoding='utf-8') as f:
+    for line in f:
+      line = line.strip()
+      if not line or line.startswith('#'):
+        continue
+      w = line.rsplit(None, 1)
+      if len(w) == 2 and w[1] in TYPES:
+        p, t = w
+      else:
+        p, t = line, None
+      p = os.path.join(os.path.dirname(path_), p)
+      ret += [(p, t)] if t is not None else collect([p], type_)
+  return ret
+
+################################ RUNNING ################################
+def run(job_):
+  ''' Run one program in a worker process, return dict of results '''
+
+  path, t, a = job_
+  res = { 'path': path, 'type': t, 'error': None, 'exit': 0,
+          'message': None, 'sha256': None, 'length': None, 'steps': None,
+          'time': None }
+  msg = io.StringIO() # std.exit_failure prints to stdout
+  out = sink.Sink('capture', 'size', a['buffer'])
+  inp = reader.Reader(a['input'] or os.devnull, a['eof'], out_=out)
+  c = mem = None
+  s = time.perf_counter()
+  try:
+    mem = tape.create(a['tape'], left_=a['left'])
+    if a['cache'] and not a['no_cache']:
+      c = cache.Cache(a['cache'], a['cache_limit'], a['rebuild_cache'])
+    with contextlib.redirect_stdout(msg):
+      p = TYPES[t](path, engine=a['engine'], level=a['optimize'], \
+        out=out, inp=inp, memory=mem, cache=c, step_limit=a['max_steps'], \
+        time_limit=a['timeout'], tape_limit=a['max_tape'], \
+        prefix=a['prefix'], threshold=a['tier_threshold'], \
+        memo_window=a['memo'], memo_entries=a['memo_entries'])
+    p = getattr(p, 'program', p) # BL/BC run a BrainFuck program
+    res['steps'] = p.steps
+    del p # memory of mmap tapes is a view of the mapping, free it first
+  except SystemExit as e:
+    res['exit'] = e.code if isinstance(e.code, int) else 1
+    res['error'] = NAMES.get(res['exit'], 'INVALID_CODE')
+    res['message'] = msg.getvalue().strip() or None
+  except Exception as e: # bug or resource problem, keep the batch going
+    res['exit'] = None
+    res['error'] = type(e).__name__
+    res['message'] = str(e)
+  finally:
+    res['time'] = round(time.perf_counter() - s, 6)
+    inp.close()
+    if mem is not None:
+      mem.close()
+    if c is not None:
+      c.close()
+
+  o = out.getvalue().encode('latin-1') # output so far (even on failure)
+  res['sha256'] = hashlib.sha256(o).hexdigest()
+  res['length'] = len(o)
+  return res
+
+def main(a_):
+  ''' Run all programs of parsed arguments a_, print results, return
+      number of programs that failed '''
+
+  jobs = [(p, t, a_) for p, t in collect(a_['source'], a_['type'])]
+  failed = 0
+  with concurrent.futures.ProcessPoolExecutor(a_['workers']) as pool:
+    for r in pool.map(run, jobs, chunksize=a_['chunksize']):
+      failed += r['error'] is not None
+      print(json.dumps(r, sort_keys=True), flush=True)
+  return failed
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "BATCH can only be imported, not run!")
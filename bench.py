@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Benchmark suite of the example programs and synthetic stress programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Phases timed separately (each --repeat times):
+    decode  - PngReader decoding the whole image (BL/BC only)
+    walk    - IP walk over the decoded image (BL/BC only)
+    lex     - source into the dict form
+    compile - dict form into code of every engine (native builds are
+              cached, so only the first build ever is slow)
+    run     - execution by every engine
+  Median and variance of every phase are printed and can be saved as a
+  JSON baseline; a later run compared with it reports phases whose median
+  got slower by more than --threshold as regressions.
+'''
+
+# IMPORTS
+import std, os, sys, json, time, hashlib, statistics, platform, \
+       brainx, bytecode, optimizer, codegen, native, image_png
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+QUIT = 'N\nlook\nquit\ny\nn\n' # session ending the Lost Kingdom game
+PROGRAMS = { 'LostKng.bf': ('F', QUIT), # example programs and their input
+             'hello1.bf': ('F', ''),
+             'hello2.bf': ('F', ''),
+             'numwarp_input.bf': ('F', ''),
+             'HelloWorld.png': ('L', ''),
+             'TheLostKingdom.png': ('C', QUIT) }
+ENGINES = ('dict', 'array', 'python', 'native', 'tiered')
+
+############################### PROGRAMS ################################
+def synthetic():
+  ''' Return {name: (source, input)} of stress programs '''
+
+  d = 100 # nested loops (more than codegen and native put in a function)
+  w = 4096 # cells the counter of the tape program moves at once
+  return {
+    'deep-nesting': ('-[>' + '>+[' * d + '-]<' * d + '<-]', ''),
+    'long-runs': (('+' * 997 + '>' * 1009 + '-' * 991 + '<' * 1009) * 50 + \
+      '.', ''),
+    'heavy-output': ('++++++++[>++++++++<-]>+<-[>' + '.' * 64 + '<-]', ''),
+    'heavy-input': (',[.,]!' + 'x' * 100000 + '\x00', ''),
+    'large-tape': ('-[[-' + '>' * w + '+' + '<' * w + ']' + '>' * w + \
+      '-]', '')
+  }
+
+def collect(sources_, type_='F'):
+  ''' Return list of (name, source, type, input): example programs found
+      in directories of sources_, files of sources_ (images of type_ if
+      it is L or C), synthetic programs '''
+
+  ret = list()
+  for s in sources_:
+    if os.path.isdir(s):
+      for n in sorted(PROGRAMS):
+        if os.path.isfile(os.path.join(s, n)):
+          ret.append((n, os.path.join(s, n)) + PROGRAMS[n])
+    elif s.lower().endswith('.png'):
+      ret.append((os.path.basename(s), s, type_ if type_ in ('L', 'C') \
+        else 'L', ''))
+    else:
+      ret.append((os.path.basename(s), s, 'F', ''))
+  for n, (src, inp) in sorted(synthetic().items()):
+    ret.append((n, src, 'F', inp))
+  return ret
+
+class Decoded():
+  ''' Decoded image walked like a streaming image_png.PngReader '''
+
+  def __init__(self, png_):
+    self.width = png_.width
+    self.height = png_.height
+    self.pixels = png_.pixels
+    self.n = png_.bpp * png_.width # bytes of one line
+
+  def rows(self):
+    ''' Yield lines of the image '''
+
+    if isinstance(self.pixels, bytearray):
+      return (self.pixels[y * self.n:(y + 1) * self.n] \
+        for y in range(0, self.height))
+    return iter(self.pixels.reshape(self.height, self.n))
+
+############################### MEASURING ###############################
+def measure(f_, n_):
+  ''' Call f_ n_ times, return (seconds of every call, last result) '''
+
+  ts = list()
+  for i in range(0, n_):
+    s = time.perf_counter()
+    r = f_()
+    ts.append(time.perf_counter() - s)
+  return ts, r
+
+def stats(ts_):
+  ''' Summary of times ts_ '''
+
+  return { 'median': statistics.median(ts_),
+           'variance': statistics.pvariance(ts_), 'runs': ts_ }
+
+def compile_for(engine_, data_, level_):
+  ''' Compile dict form data_ into code of engine_ '''
+
+  bc = optimizer.optimize(bytecode.compile_dict(data_), level_)
+  if engine_ == 'python':
+    return codegen.translate(bc)
+  if engine_ == 'native':
+    return native.translate(bc)
+  return bc
+
+def bench(name_, source_, type_, input_, engines_, level_, n_):
+  ''' Time all phases of one program, return {phase: stats} '''
+
+  ret = dict()
+  if type_ in brainx.IMAGES:
+    cls = brainx.IMAGES[type_]
+    ts, png = measure(lambda: image_png.PngReader(source_), n_)
+    ret['decode'] = stats(ts)
+    ts, source_ = measure(lambda: cls.process_input(Decoded(png)), n_)
+    ret['walk'] = stats(ts)
+
+  p = brainx.Program(source_, 'dict')
+  ts, data = measure(lambda: p.process_input(source_), n_)
+  ret['lex'] = stats(ts)
+
+  out = set() # digests of the output of all engines
+  inp = input_.encode('latin-1')
+  for e in engines_:
+    if e != 'dict':
+      ts, c = measure(lambda: compile_for(e, data, level_), n_)
+      ret['compile/' + e] = stats(ts)
+    p = brainx.Program(source_, e, level_)
+    ts, r = measure(lambda: p.run(inp), n_)
+    ret['run/' + e] = stats(ts)
+    out.add(hashlib.sha256(r.output.encode('latin-1')).hexdigest())
+  if len(out) > 1:
+    print(std.create_error_msg("INTERNAL", name_ + ": engines differ in " + \
+      "output", True), file=sys.stderr)
+  return ret
+
+################################ RUNNING ################################
+def compare(name_, new_, old_, threshold_):
+  ''' Print results new_ of program name_ (against its baseline old_),
+      return number of phases slower by more than threshold_ (fraction) '''
+
+  bad = 0
+  for phase, s in sorted(new_.items()):
+    line = '{0:20} {1:16} {2:10.6f} s  var {3:.3e}'.format(name_, phase, \
+      s['median'], s['variance'])
+    if phase in old_ and old_[phase]['median'] > 0:
+      d = s['median'] / old_[phase]['median'] - 1
+      line += '  {0:+7.1%} vs {1:.6f} s'.format(d, old_[phase]['median'])
+      if d > threshold_:
+        line += '  REGRESSION'
+        bad += 1
+    print(line, flush=True)
+  return bad
+
+def main(a_):
+  ''' Benchmark programs of parsed arguments a_, return number of
+      regressions against the baseline '''
+
+  engines = [e for e in a_['bench_engines'].split(',') \
+    if e != 'native' or native.available()]
+  if any(e not in ENGINES for e in engines):
+    std.exit_failure("INVALID_CODE", "engines must be some of " + \
+      ','.join(ENGINES))
+  old = dict()
+  if a_['baseline']:
+    with open(a_['baseline'], 'r') as f:
+      old = json.load(f)['results']
+
+  new = { 'version': std.__version__, 'python': platform.python_version(),
+          'numpy': image_png.numpy is not None, 'level': a_['optimize'],
+          'repeat': a_['repeat'], 'results': dict() }
+  bad = 0
+  for name, src, t, inp in collect(a_['source'], a_['type']):
+    r = bench(name, src, t, inp, engines, a_['optimize'], a_['repeat'])
+    new['results'][name] = r
+    bad += compare(name, r, old.get(name, dict()), a_['threshold'])
+
+  if a_['save_baseline']:
+    with open(a_['save_baseline'], 'w') as f:
+      json.dump(new, f, indent=2, sort_keys=True)
+  return bad
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "BENCH can only be imported, not run!")
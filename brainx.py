@@ -7,7 +7,9 @@
 '''
 
 # IMPORTS
-import std, os.path, sys, image_png
+import std, sys, re, copy, zlib, time, image_png, bytecode, optimizer, \
+       codegen, native, sink, reader, tape, lexer, profiler, aio, \
+       snapshot, partial, tiered, memo, lockstep
 
 # CREDITS
 __author__  = std.__author__
@@ -18,17 +20,96 @@ __license__ = std.__license__
 __year__    = std.__year__
 
 
-############################ BF INTERPRETER #############################
-class BrainFuck():
-  ''' BrainFuck programming language interpreter '''
+############################## EXCEPTIONS ###############################
+class BrainError(Exception):
+  ''' EXCEPTION: program cannot be compiled or run, .code is the name of
+      the exit code in std.EXIT_CODES '''
+
+  code = "INVALID_CODE"
+
+  def __init__(self, error_, code_=None):
+    Exception.__init__(self, error_)
+    if code_ is not None:
+      self.code = code_
+
+class ParseError(BrainError):
+  ''' EXCEPTION: source code cannot be parsed or compiled '''
+  code = "BF_PROCESS_INPUT"
+
+class ExecutionError(BrainError):
+  ''' EXCEPTION: program failed while running, .result is the Result
+      (output, memory, pointer) at the moment it stopped '''
+  code = "BF_EXECUTE_CODE"
+  result = None
+
+class StepLimitError(ExecutionError):
+  ''' EXCEPTION: program executed more instructions than allowed '''
+  code = "BF_STEP_LIMIT"
+
+class TimeLimitError(ExecutionError):
+  ''' EXCEPTION: program ran longer than allowed '''
+  code = "BF_TIME_LIMIT"
+
+class TapeLimitError(ExecutionError):
+  ''' EXCEPTION: program needed more memory cells than allowed '''
+  code = "BF_TAPE_LIMIT"
+
+class StoppedError(ExecutionError):
+  ''' EXCEPTION: program was stopped after saving its snapshot '''
+  code = "BF_STOPPED"
+
+FAILURES = (bytecode.LimitError, snapshot.Stopped, OSError, TypeError, \
+            ValueError, IndexError, KeyError, MemoryError) # raised by runs
+
+def failure(e_):
+  ''' Return ExecutionError (subclass) of failure e_ of a run '''
+
+  if isinstance(e_, bytecode.LimitError):
+    return StepLimitError(e_) if e_.kind == 'steps' else TimeLimitError(e_)
+  if isinstance(e_, tape.TapeLimitError):
+    return TapeLimitError(e_)
+  if isinstance(e_, snapshot.Stopped):
+    return StoppedError(e_)
+  return ExecutionError(e_)
+
+class DecodeError(BrainError):
+  ''' EXCEPTION: image of BL/BC program cannot be decoded '''
+  code = "BL_DECODE_PNG"
+
+class TranslateError(BrainError):
+  ''' EXCEPTION: BrainFuck program cannot be made from BL/BC image '''
+  code = "BL_PROCESS_INPUT"
+
+
+
+############################### RESULT ##################################
+class Result():
+  ''' Outcome of one run of a Program '''
+
+  def __init__(self, output, memory, memory_pointer, steps, profile=None):
+    self.output = output # everything the program wrote (if kept by sink)
+    self.memory = memory # cells of the program
+    self.memory_pointer = memory_pointer # index into memory
+    self.steps = steps # instructions executed (None if not counted)
+    self.profile = profile # profiler.Profile of a profiled run
+
+
+
+############################### PROGRAM #################################
+class Program():
+  ''' BrainFuck program compiled once, run any number of times (also from
+      many threads at once, every run has its own tape, input, output) '''
+
+  check = None # limits of a run (see bytecode.budget)
  
 ############################ INSTRUCTIONS ###############################
   def i_memInc(self, mem_, p_mem_, code_, ip_, out_):
     ''' Execute > instruction '''
     
     p_mem_ += code_[ip_][1]
-    if len(mem_) <= p_mem_:
-      mem_ += b'\x00' * code_[ip_][1]
+    if self.tape.L <= p_mem_:
+      self.tape.L += code_[ip_][1]
+      self.tape.reserve(self.tape.L)
 
     return ip_ + code_[ip_][1], p_mem_
 
@@ -36,7 +117,9 @@ class BrainFuck():
     ''' Execute < instruction '''
     
     p_mem_ -= code_[ip_][1]
-    if p_mem_ < 0:
+    if p_mem_ < 0 and self.tape.left:
+      p_mem_ += self.tape.shift(-p_mem_, self.tape.L)
+    elif p_mem_ < 0:
       p_mem_ = 0
 
     return ip_ + code_[ip_][1], p_mem_
@@ -56,24 +139,13 @@ class BrainFuck():
   def i_write(self, mem_, p_mem_, code_, ip_, out_):
     ''' Execute . instruction '''
     
-    out_.append(chr(mem_[p_mem_]) * code_[ip_][1])
-    sys.stdout.write(chr(mem_[p_mem_]) * code_[ip_][1])
-    sys.stdout.flush()
+    out_.write(chr(mem_[p_mem_]) * code_[ip_][1])
     return ip_ + code_[ip_][1], p_mem_
 
   def i_read(self, mem_, p_mem_, code_, ip_, out_):
     ''' Execute , instruction '''
     
-    if 'stdin' in code_:
-      i = 0
-      while len(code_['stdin']) >= 1 and i < code_[ip_][1]:
-        i += 1
-        mem_[p_mem_] = ord(code_['stdin'][0]) % 256
-        code_['stdin'] = code_['stdin'][1:]
-    else:
-      for x in range(0, code_[ip_][1]):
-        mem_[p_mem_] = ord(sys.stdin.read(1)) % 256
-
+    mem_[p_mem_] = self.reader.read(code_[ip_][1], mem_[p_mem_])
     return ip_ + code_[ip_][1], p_mem_
 
   def i_loopBeg(self, mem_, p_mem_, code_, ip_, out_):
@@ -103,106 +175,530 @@ class BrainFuck():
                       '[': i_loopBeg,
                       ']': i_loopEnd 
                     }
+  runs = re.compile(rb'>+|<+|\++|-+|\.+|,+|\[|\]') # Instruction runs
 
 ######################### PARSER && INTERPRETER #########################
   def bf2dict(self, data_):
-    ''' Convert source code into internal form for faster execution '''
+    ''' Convert source code (string or iterable of lexer.Lexer chunks)
+        into internal form for faster execution '''
 
     def save_prev():
       ''' Save previous instruction into dict() '''
 
-      nonlocal prev, c
-      if prev[0] in nc:
-        p[prev[1]] = (prev[0], c)
-      prev = (data_[i], i)
-      c = 1
+      if prev:
+        p[prev[1]] = (prev[0], prev[2])
 
     p = dict() # Program in internal form
     s = list() # Stack for loops parsing
-    L = len(data_) # Input length
-    i = 0 # Helper IP
-    c = 0 # Same instructions counter
-    prev = (data_[i], i) # Previous inst. (instr_type, instr_addr)
-    nc = ('>', '<', '+', '-', '.', ',') # Non-control instructions
-
-    for i in range(0, L): # Convert source code to dict() representation
-      if data_[i] in nc:
-        if data_[i] == prev[0]:
-          c += 1
+    L = 0 # Input length (of chunks already parsed)
+    prev = None # Previous inst. [instr_type, instr_addr, count]
+
+    if isinstance(data_, str): # Whole source, maybe with input after !
+      if '!' in data_:
+        p['stdin'] = data_[data_.find('!') + 1:]
+        data_ = data_[:data_.find('!')]
+      data_ = [data_.encode('utf-8', 'surrogateescape')]
+
+    for chunk in data_: # Convert source code to dict() representation
+      for m in self.runs.finditer(chunk):
+        i = L + m.start()
+        op = chr(chunk[m.start()])
+        if op == '[':
+          save_prev()
+          prev = None
+          s.append(i)
+        elif op == ']':
+          save_prev()
+          prev = None
+          if not s:
+            raise ValueError("unmatched ] at offset {0}".format(i))
+          a = s.pop()
+          p[a] = ('[', i + 1)
+          p[i] = (']', a)
+        elif prev and prev[0] == op and prev[1] + prev[2] == i: # Run
+          prev[2] += m.end() - m.start() # continues from previous chunk
         else:
           save_prev()
-      elif data_[i] == '[':
-        save_prev()
-        s.append(i)
-      elif data_[i] == ']':
-        save_prev()
-        a = s.pop()
-        p[a] = ('[', i + 1)
-        p[i] = (']', a)
-      elif data_[i] == '!':
-        p['stdin'] = data_[i + 1:]
-        i -= 1
-        break
-
-    if prev[0] in nc:
-      p[prev[1]] = (prev[0], c)
-    p[i+1] = ('@', 0) # Add STOP instruction
-    
+          prev = [op, i, m.end() - m.start()]
+      L += len(chunk)
+
+    if L == 0:
+      raise ValueError("source code seems to be empty")
+    if s: # every engine but dict would just drop the [
+      raise ValueError("unmatched [ at offset {0}".format(s[-1]))
+
+    save_prev()
+    p[L] = ('@', 0) # Add STOP instruction
+
     return p
 
   def process_input(self, data_):
     ''' Clean comments && separate input marked by ! from source code '''
 
-    if os.path.isfile(data_): # If data_ is a file, ...
-      with open(data_, encoding='ascii') as f: # ... it's source code ...
-        data_ = f.read() # ... else data_ itself is treated as source 
+    if isinstance(data_, bytes): # clean code (of BL/BC), nothing to lex
+      return self.bf2dict([data_])
 
-    if '!' in data_: # Strip the input if there is any
-      i = data_[data_.find('!'):]
-      data_ = data_[:data_.find('!')]
-    else:
-      i = str()
-
-    allowed_chars = list(self.instruction_set)
-    for c in str(data_): # Get rid of comments
-      if c not in allowed_chars:
-        allowed_chars.append(c)
-        data_ = data_.replace(c, '')
+    code = lexer.Lexer(data_) # data_ is a file or source code itself
+    try:
+      p = self.bf2dict(code)
+    finally:
+      code.close()
+    if code.stdin is not None:
+      p['stdin'] = code.stdin
 
-    if len(data_) == 0:
-      raise ValueError("source code seems to be empty")
-
-    return self.bf2dict(data_ + i)
+    return p
 
-  def execute_code(self, code_, mem_, p_mem_):
+  def execute_code(self, code_, tape_, out_):
     ''' Run code in internal form '''
 
     ip = 0 # instruction pointer
-    output = list() # stdout
+    mem = tape_.cells
+    p_mem = tape_.p
+    n = 0 # instructions (runs) executed
+    check = self.check or bytecode.budget()
+    due = check(0) # instructions executed when limits are checked next
 
-    while code_[ip] != ('@', 0): # Execution stops at STOP instruction
-      ip, p_mem_ = self.instruction_set[code_[ip][0]](self, mem_, p_mem_,\
-                                                      code_, ip, output)
+    try:
+      while code_[ip] != ('@', 0): # Execution stops at STOP instruction
+        ip, p_mem = self.instruction_set[code_[ip][0]](self, mem, p_mem, \
+                                                       code_, ip, out_)
+        n += 1
+        if n > due:
+          tape_.p = p_mem
+          due = check(n)
+    finally:
+      tape_.p = p_mem
 
-    return output, mem_, p_mem_
+    return n
 
-####################### CONSTRUCTOR == RUN PROGRAM ######################
-  def __init__(self, data, memory=b'\x00', memory_pointer=0):
-    ''' Parse, execute and store output of code in data '''
+  def execute_array(self, code_, tape_, out_):
+    ''' Run code compiled to bytecode '''
+
+    return bytecode.execute(code_, tape_, out_, self.reader, self.check)
+
+  def execute_python(self, code_, tape_, out_):
+    ''' Run code translated to Python '''
+
+    return codegen.execute(code_, tape_, out_, self.reader, self.check)
 
-    try: # Process the input and convert it to dict()
-      self.data = self.process_input(data)
-    except (OSError, IOError, TypeError, ValueError, IndexError) as e:
-      std.exit_failure("BF_PROCESS_INPUT", \
-        std.create_error_msg("PYTHON", e))
+  def execute_native(self, code_, tape_, out_):
+    ''' Run code compiled to native shared object '''
 
-    try: # Execute the programme in self.data
-      self.output, self.memory, self.memory_pointer = \
-        self.execute_code(self.data, bytearray(memory), memory_pointer)
-    except (OSError, TypeError, ValueError, IndexError, KeyError) as e:
-      std.exit_failure("BF_EXECUTE_CODE", std.create_error_msg("PYTHON", e))
+    return native.execute(code_, tape_, out_, self.reader, self.check)
 
-    self.output = ''.join(self.output)
+  def execute_tiered(self, code_, tape_, out_):
+    ''' Run bytecode compiling its hot loops to Python '''
+
+    return tiered.execute(code_, tape_, out_, self.reader, self.check, \
+                          self.tiers)
+
+  def execute_memo(self, code_, tape_, out_):
+    ''' Run bytecode replaying pure balanced loops from the memo '''
+
+    return memo.execute(code_, tape_, out_, self.reader, self.check, \
+                        self.memo)
+
+  def execute_profile(self, code_, tape_, out_):
+    ''' Run code translated to Python counting iterations of loops '''
+
+    self.prof = [0] * len(self.profiled_code()[0]) # by index of JZ
+    return codegen.execute(code_, tape_, out_, self.reader, self.check, \
+                           self.prof)
+
+  def execute_snapshot(self, code_, tape_, out_):
+    ''' Run bytecode saving snapshots (from a snapshot) '''
+
+    return snapshot.execute(code_, tape_, out_, self.reader, self.check, \
+                            self.point, *self.start)
+
+  def optimize_code(self, code_):
+    ''' Convert code in internal form to optimized bytecode '''
+
+    return optimizer.optimize(bytecode.compile_dict(code_), self.level)
+
+  def compile_code(self, code_):
+    ''' Convert optimized bytecode into code for the engine (Python, C) '''
+
+    code = code_
+    if self.engine == 'native':
+      try:
+        return native.translate(code)
+      except (native.NativeError, OSError) as e: # no compiler, fall back
+        print(std.create_error_msg("PYTHON", e, True), file=sys.stderr)
+        self.engine = 'array'
+    if self.engine == 'python':
+      code = codegen.translate(code)
+
+    return code
+
+  def counting_code(self, engine_):
+    ''' Code for engine_ (python or native) counting instructions, so
+        limits can be checked, translated when first needed '''
+
+    if engine_ not in self.counting:
+      f = native.translate if engine_ == 'native' else codegen.translate
+      self.counting[engine_] = f(self.ir if self.folded is None else \
+                                 self.folded, True)
+
+    return self.counting[engine_]
+
+  def profiled_code(self):
+    ''' Bytecode and its Python translation counting iterations of loops
+        (and instructions), translated when first needed '''
+
+    if self.profiled is None:
+      bc = self.array_code()
+      self.profiled = (bc, codegen.translate(bc, True, True))
+
+    return self.profiled
+
+  def array_code(self):
+    ''' Bytecode of the program (of the very same instructions for the
+        dict engine), compiled when first needed '''
+
+    if self.bc is None:
+      self.bc = bytecode.compile_dict(self.ir) if isinstance(self.ir, \
+        dict) else self.ir
+
+    return self.bc
+
+  def prefix_code(self, source_, budget_, cache_):
+    ''' Residual of the program after its input-independent prefix (at
+        most budget_ instructions evaluated), None if there is none '''
+
+    key = cache_.key(source_, 'prefix:' + str(budget_), self.level) if \
+      cache_ is not None else None
+    code = cache_.load(key, 'prefix') if key is not None else None
+    if code is None:
+      code = partial.evaluate(self.ir, budget_)
+      if key is not None:
+        cache_.store(key, code)
+
+    return code if code.prefix is not None else None
+
+  def warm(self, tape_, out_, step_limit_):
+    ''' Start a run on tape_ after the evaluated prefix if it begins on an
+        empty tape and limits allow, return instructions of the prefix
+        (None if the run has to execute the whole program) '''
+
+    if self.folded is None:
+      return None
+    n, cells, p, s = self.folded.prefix
+    if tape_.L - tape_.low != 1 or tape_.cells[tape_.low] or \
+       tape_.p != tape_.low or len(cells) > tape_.cap or \
+       (step_limit_ is not None and step_limit_ < n):
+      return None
+
+    tape_.load(cells, p)
+    if s:
+      out_.write(s)
+    return n
+
+############################### ENGINES #################################
+  engines = {
+              'dict': execute_code,
+              'array': execute_array,
+              'python': execute_python,
+              'native': execute_native,
+              'tiered': execute_tiered,
+              'memo': execute_memo,
+              'profile': execute_profile,
+              'snapshot': execute_snapshot
+            }
+
+####################### CONSTRUCTOR == COMPILE ##########################
+  def __init__(self, source, engine='array', level=1, cache=None, \
+               prefix=None, threshold=None, memo_window=None, \
+               memo_entries=None):
+    ''' Parse and compile source (file or source code itself, clean code
+        as bytes) for engine, evaluate at most prefix instructions of its
+        input-independent prefix (see partial) if set, raise
+        ParseError on failure; loops iterated threshold times are hot
+        for the tiered engine, the array engine memoizes pure loops
+        touching at most memo_window cells (memo_entries windows) if set '''
+
+    self.engine = engine # name of the execution engine
+    self.level = level # optimization level (engines other than dict)
+    self.counting = dict() # engine -> code checking limits of runs
+    self.profiled = None # (bytecode, code) of profiled runs
+    self.bc = None # bytecode of runs needing the array engine
+    self.folded = None # residual after the evaluated prefix
+    self.tiers = None # loops compiled by the tiered engine
+    if engine == 'tiered':
+      self.tiers = tiered.Tiers(threshold or tiered.THRESHOLD)
+    self.memo = None # pure loops replayed by the array engine
+    if memo_window is not None:
+      self.memo = memo.Memo(memo_window, memo_entries or memo.ENTRIES)
+
+    try: # Process the input and convert it to dict() (and bytecode)
+      form = 'dict' if engine == 'dict' else 'bytecode'
+      key = cache.key(source, form, level) if cache is not None else None
+      ir = cache.load(key, form) if key is not None else None
+      self.data = None # dict() form, not needed when ir is in the cache
+      if ir is None:
+        self.data = self.process_input(source)
+        ir = self.data if engine == 'dict' else self.optimize_code(self.data)
+        if key is not None:
+          cache.store(key, ir)
+      self.ir = ir # bytecode of engines the run may fall back from
+      if prefix is not None and engine != 'dict':
+        self.folded = self.prefix_code(source, prefix, cache)
+      self.code = ir if engine == 'dict' else self.compile_code(ir if \
+        self.folded is None else self.folded)
+    except (OSError, IOError, TypeError, ValueError, IndexError, \
+            SyntaxError, MemoryError) as e:
+      raise ParseError(e)
+
+    self.stdin = ir.get('stdin') if engine == 'dict' else ir.stdin
+
+############################### RUN #####################################
+  def run(self, inp=None, memory=b'\x00', memory_pointer=0, \
+          step_limit=None, out=None, time_limit=None, tape_limit=None, \
+          profile=False, checkpoint=None, resume=None):
+    ''' Run the program, return Result, raise ExecutionError on failure
+        inp         - reader.Reader or the input itself (str or bytes),
+                      no input if None; input embedded in source wins
+        memory      - tape.Tape of any kind or initial cells (bytes)
+        step_limit  - max instructions executed (StepLimitError else)
+        out         - sink.Sink, output is kept in Result if None
+        time_limit  - max seconds of the run (TimeLimitError else)
+        tape_limit  - max cells of the tape (TapeLimitError else)
+        profile     - run instrumented code, Result.profile is set
+        checkpoint  - snapshot.Checkpoint saving snapshots of the run
+        resume      - snapshot.Snapshot the run continues from (memory
+                      and memory_pointer are ignored)
+        Limits are checked once per loop iteration, the error carries
+        the Result of the run so far. Runs with checkpoint or resume
+        execute bytecode (of the array engine), step_limit counts the
+        instructions executed before the snapshot too. '''
+
+    o = out if out is not None else sink.Sink('capture')
+    if isinstance(inp, reader.Reader):
+      r = inp
+    else:
+      r = reader.Reader()
+      r.embed(inp if inp is not None else b'')
+    if r.out is None:
+      r.out = o
+    if self.stdin is not None: # Input embedded in the source wins
+      r.embed(self.stdin)
+    t = memory if isinstance(memory, tape.Tape) else tape.Tape(memory)
+    t.p = t.low + memory_pointer
+    if tape_limit is not None:
+      t.cap = tape_limit
+
+    engine, code = self.engine, self.code
+    if checkpoint is not None or resume is not None:
+      if engine in ('python', 'native', 'tiered'):
+        print(std.create_error_msg("PYTHON", "snapshots need the array " + \
+          "engine, running it instead", True), file=sys.stderr)
+      engine, code = 'snapshot', self.array_code()
+    elif profile:
+      engine, code = 'profile', self.profiled_code()[1]
+    elif engine == 'native' and (t.left or type(t) is not tape.Tape):
+      print(std.create_error_msg("PYTHON", "native engine needs a flat " + \
+        "tape not growing to the left", True), file=sys.stderr)
+      engine, code = 'array', self.ir
+
+    skip = None # instructions of the prefix evaluated at compile time
+    if self.folded is not None and engine in ('array', 'python', \
+                                               'native', 'tiered'):
+      skip = self.warm(t, o, step_limit)
+      if skip is not None and engine in ('array', 'tiered'):
+        code = self.folded
+      elif skip is None: # compiled code starts after the prefix
+        engine, code = 'tiered' if engine == 'tiered' else 'array', self.ir
+    if engine == 'array' and self.memo is not None:
+      engine = 'memo'
+
+    vm = copy.copy(self) # state of this run, the program is shared
+    vm.tape, vm.reader = t, r
+    vm.point, vm.start = checkpoint, (0, 0)
+    if step_limit is not None or time_limit is not None:
+      vm.check = bytecode.budget(step_limit if step_limit is None or \
+        skip is None else step_limit - skip, None if time_limit is None \
+        else time.monotonic() + time_limit)
+
+    def stop(e_, steps_=None):
+      ''' Return error e_ of the run, with the Result so far '''
+
+      o.close()
+      m, p = t.memory()
+      e_.result = Result(o.getvalue(), m, p, more(steps_), prof(m))
+      return e_
+
+    def more(steps_):
+      ''' Instructions executed including the evaluated prefix '''
+
+      return steps_ + skip if steps_ is not None and skip else steps_
+
+    def prof(m_):
+      ''' Profile of the run (approximate when it did not finish) '''
+
+      if not profile or getattr(vm, 'prof', None) is None:
+        return None
+      return profiler.Profile(self.profiled_code()[0], vm.prof, len(m_))
+
+    try: # Execute the programme in code
+      if resume is not None:
+        resume.restore(code, t, r)
+        vm.start = (resume.ip, resume.steps)
+      if vm.check is not None and engine in ('python', 'native'):
+        code = self.counting_code(engine)
+      steps = self.engines[engine](vm, code, t, o)
+    except FAILURES as e:
+      raise stop(failure(e), getattr(e, 'steps', None))
+
+    o.close()
+    m, p = t.memory()
+    return Result(o.getvalue(), m, p, more(steps), prof(m))
+
+############################### RUN ASYNC ###############################
+  async def run_async(self, reader, writer, memory=b'\x00', \
+                      memory_pointer=0, step_limit=None, time_limit=None, \
+                      tape_limit=None, eof='keep', slice_steps=aio.SLICE):
+    ''' Run the program as asyncio task reading asyncio stream reader and
+        writing everything to stream writer as soon as it can, other tasks
+        run whenever it waits for input and every slice_steps instructions;
+        return Result (output was sent), raise ExecutionError on failure
+        eof         - reader.EOF_POLICIES name
+        other arguments are the same as of run '''
+
+    i, o = aio.Input(eof), aio.Output()
+    if self.stdin is not None: # Input embedded in the source wins
+      i.embed(self.stdin)
+    t = memory if isinstance(memory, tape.Tape) else tape.Tape(memory)
+    t.p = t.low + memory_pointer
+    if tape_limit is not None:
+      t.cap = tape_limit
+    code, skip = self.array_code(), self.warm(t, o, step_limit)
+    if skip is not None:
+      code = self.folded
+      if step_limit is not None:
+        step_limit -= skip
+    check = None
+    if step_limit is not None or time_limit is not None:
+      check = bytecode.budget(step_limit, None if time_limit is None \
+        else time.monotonic() + time_limit)
+
+    try:
+      steps = await aio.execute(code, t, i, o, reader, writer, check, \
+                                slice_steps) + (skip or 0)
+    except FAILURES as e:
+      err = failure(e)
+      m, p = t.memory()
+      n = getattr(e, 'steps', None)
+      err.result = Result(''.join(o.buf), m, p, n if n is None else \
+        n + (skip or 0))
+      raise err # with output not sent yet
+
+    m, p = t.memory()
+    return Result('', m, p, steps)
+
+  def run_many(self, inputs, step_limit=None, time_limit=None, \
+               tape_limit=None, eof='keep', lanes=lockstep.LANES):
+    ''' Run the program once for every input (str or bytes) of inputs,
+        lanes of them at once in lockstep (see lockstep), one after
+        another without NumPy; return list of Result or ExecutionError
+        (with the Result of the run so far) of every input
+        eof         - reader.EOF_POLICIES name
+        time_limit  - max seconds of lanes runs together
+        other arguments are the same as of run '''
+
+    data = list()
+    for i in inputs: # as bytes, input embedded in source wins
+      r = reader.Reader(None, eof)
+      r.embed(i if self.stdin is None else self.stdin)
+      data.append(r)
+    if not lockstep.available():
+      ret = list()
+      for r in data:
+        try:
+          ret.append(self.run(r, step_limit=step_limit, \
+            time_limit=time_limit, tape_limit=tape_limit))
+        except ExecutionError as e:
+          ret.append(e)
+      return ret
+
+    t, o = tape.Tape(), sink.Sink('capture')
+    if tape_limit is not None:
+      t.cap = tape_limit
+    code, skip = self.array_code(), self.warm(t, o, step_limit)
+    if skip is not None:
+      code = self.folded
+      if step_limit is not None:
+        step_limit -= skip
+    o.close()
+    s = o.getvalue()
+    ret = list()
+    for b in range(0, len(data), lanes):
+      deadline = None if time_limit is None else \
+        time.monotonic() + time_limit
+      for out, m, p, n, e in lockstep.execute(code, [bytes(r.buf) for r \
+          in data[b:b + lanes]], eof, step_limit, deadline, tape_limit, \
+          t.cells[:t.L], t.p):
+        r = Result(s + out, m, p, n + skip if n is not None and skip else n)
+        if e is not None:
+          e = failure(e)
+          e.result = r
+        ret.append(r if e is None else e)
+    return ret
+
+
+
+############################ BF INTERPRETER #############################
+class BrainFuck(Program):
+  ''' BrainFuck programming language interpreter '''
+
+####################### CONSTRUCTOR == RUN PROGRAM ######################
+  def __init__(self, data, memory=b'\x00', memory_pointer=0, \
+               engine='array', level=1, report=False, out=None, inp=None, \
+               cache=None, step_limit=None, time_limit=None, \
+               tape_limit=None, profile=False, profile_json=None, \
+               checkpoint=None, resume=None, prefix=None, threshold=None, \
+               memo_window=None, memo_entries=None):
+    ''' Parse, execute and store output of code in data '''
+
+    self.sink = out if out is not None else sink.Sink() # stdout
+    if isinstance(memory, tape.Tape): # memory of any kind
+      self.tape = memory
+    else: # just the initial cells
+      self.tape = tape.Tape(memory)
+    self.reader = inp if inp is not None else reader.Reader() # stdin
+    if self.reader.out is None:
+      self.reader.out = self.sink
+
+    try:
+      Program.__init__(self, data, engine, level, cache, prefix, threshold, \
+                       memo_window, memo_entries)
+    except BrainError as e:
+      std.exit_failure(e.code, std.create_error_msg("PYTHON", e))
+
+    if report and self.engine != 'dict': # Tell what the optimizer did
+      print(optimizer.report(self.code), file=sys.stderr)
+      if self.folded is not None:
+        print(partial.report(self.folded), file=sys.stderr)
+
+    try:
+      r = self.run(self.reader, self.tape, memory_pointer, step_limit, \
+                   self.sink, time_limit, tape_limit, \
+                   profile or profile_json is not None, checkpoint, resume)
+    except BrainError as e:
+      if e.result is not None and e.result.profile is not None:
+        profiler.dump(e.result.profile, profile, profile_json) # so far
+      e.result = None # may be a view of the tape closed after exit
+      std.exit_failure(e.code, std.create_error_msg("PYTHON", e))
+
+    self.output = r.output
+    self.memory, self.memory_pointer = r.memory, r.memory_pointer
+    self.steps = r.steps
+    self.profile = r.profile
+    if r.profile is not None:
+      profiler.dump(r.profile, profile, profile_json)
+    if report and self.tiers is not None:
+      print(self.tiers.report(), file=sys.stderr)
+    if report and self.memo is not None:
+      print(self.memo.report(), file=sys.stderr)
 
   def get_memory(self):
     return self.memory
@@ -213,131 +709,172 @@ class BrainFuck():
 class BrainLoller():
   ''' BrainLoller programming language interpreter '''
 
-############################# CONVERT CODE TO BF ########################
-  def process_input(self, png_):
-    ''' Convert decoded PNG to BrainFuck program '''
+  name = 'BL' # prefix of error codes
+  instructions = b'><+-.,[]' # opcodes 0 - 7, 8 and 9 rotate the IP
+  NOP = 10 # opcode of pixels doing nothing
+  strides = ((1, 0), (0, 1), (-1, 0), (0, -1)) # x, y steps of R, D, L, U
+  colors =  { # colors of instructions and their opcodes
+              (255, 0, 0): 0,     # >
+              (128, 0, 0): 1,     # <
+              (0, 255, 0): 2,     # +
+              (0, 128, 0): 3,     # -
+              (0, 0, 255): 4,     # .
+              (0, 0, 128): 5,     # ,
+              (255, 255, 0): 6,   # [
+              (128, 128, 0): 7,   # ]
+              (0, 255, 255): 8,   # rotate R
+              (0, 128, 128): 9    # rotate L
+            }
+  opcodes = dict((bytes(k), v) for k, v in colors.items()) # by raw pixel
+
+############################ CLASSIFY PIXELS ############################
+  @classmethod
+  def classify(cls, L_):
+    ''' Return opcodes of pixels of line L_ '''
+
+    if not isinstance(L_, (bytes, bytearray)): # uint8 array
+      p = L_.reshape(-1, 3).astype(image_png.numpy.uint32)
+      v = p[:, 0] << 16 | p[:, 1] << 8 | p[:, 2]
+      ret = image_png.numpy.full(len(v), cls.NOP, \
+        dtype=image_png.numpy.uint8)
+      for (r, g, b), op in cls.colors.items():
+        ret[v == (r << 16 | g << 8 | b)] = op
+      return ret.tobytes()
+
+    L = bytes(L_)
+    return bytes(cls.opcodes.get(L[j:j + 3], cls.NOP) \
+      for j in range(0, len(L), 3))
 
-    x = 0 # x coordinate (zero means left)
-    y = 0 # y coordinate (zero means up)
+############################# CONVERT CODE TO BF ########################
+  @classmethod
+  def process_input(cls, png_):
+    ''' Walk decoded PNG, return BrainFuck program as clean code (bytes) '''
+
+    w = png_.width # width
+    n = w * png_.height # pixels
+    rows = png_.rows() # lines are decoded only when the IP gets to them
+    grid = bytearray() # opcodes of lines decoded so far
+    steps = tuple(dx + dy * w for dx, dy in cls.strides) # index strides
+    code = bytearray() # brainfuck code
+    i = x = 0 # index into the grid, x coordinate (zero means left)
     d = 0 # default exectuion direction (right)
-    h = len(png_) # height
-    w = len(png_[0]) # width
-    code = list() # brainfuck code
-    directions =  { # all possible directions to move in code
-                    0: lambda x, y: (x+1, y), # go R
-                    1: lambda x, y: (x, y+1), # go D
-                    2: lambda x, y: (x-1, y), # go L
-                    3: lambda x, y: (x, y-1)  # go U
-                  }
-    instruction_set = { # instructions convertable to BF instructions
-                        (255, 0, 0): '>',
-                        (128, 0, 0): '<',
-                        (0, 255, 0): '+',
-                        (0, 128, 0): '-',
-                        (0, 0, 255): '.',
-                        (0, 0, 128): ',',
-                        (255, 255, 0): '[',
-                        (128, 128, 0): ']'
-                      }
-    direction_change =  { # instructions changing IP direction
-                          (0, 255, 255): lambda x: (x+1)%4, # rotate R
-                          (0, 128, 128): lambda x: (x-1)%4  # rotate L 
-                        }
-    
-    while 0 <= y < h and 0 <= x < w:
-      if png_[y][x] in instruction_set:
-        code.append(instruction_set[png_[y][x]])
-
-      if png_[y][x] in direction_change:
-        d = direction_change[png_[y][x]](d)
-
-      x, y = directions[d](x, y)
-    
-    return ''.join(code)
 
-####################### CONSTRUCTOR == RUN PROGRAM ######################
-  def __init__(self, filename):
-    ''' Decode, parse and execute program in PNG format '''
+    # The IP cannot cycle forever: every pixel maps directions one to one,
+    # so each (pixel, direction) state has a single predecessor and the
+    # start (entered from outside) is on no cycle => it leaves the image
+    # after at most 4 * n steps, no visited set is needed.
+    while 0 <= x < w and 0 <= i < n:
+      while i >= len(grid):
+        grid += cls.classify(next(rows))
+
+      op = grid[i]
+      if op < 8:
+        code.append(cls.instructions[op])
+      elif op == 8: # rotate R
+        d = (d + 1) & 3
+      elif op == 9: # rotate L
+        d = (d - 1) & 3
+
+      i += steps[d]
+      x += cls.strides[d][0]
+
+    return bytes(code)
+
+  @classmethod
+  def translate(cls, filename_, cache_=None):
+    ''' Return BrainFuck program in PNG filename_ (from cache_ if it was
+        extracted before), raise DecodeError or TranslateError '''
+
+    try: # program extracted from the same image before?
+      key = cache_.key(filename_, cls.name, 0) if cache_ is not None \
+        else None
+      code = cache_.load(key, cls.name) if key is not None else None
+    except (IOError, TypeError) as e:
+      raise DecodeError(e, cls.name + "_DECODE_PNG")
+    if code is not None:
+      return code
 
     try: # try to decode the png
-      self.png = image_png.PngReader(filename)
+      png = image_png.PngReader(filename_, stream=True)
     except (IOError, image_png.PNGErrorCRC32, image_png.PNGMissingIDAT,\
-      image_png.PNGMissingIEND, image_png.PNGMissingIHDR) as e:
-      std.exit_failure("BL_DECODE_PNG", \
-        std.create_error_msg("PYTHON", e))
+      image_png.PNGMissingIEND, image_png.PNGMissingIHDR, \
+      image_png.PNGWrongHeaderError, image_png.PNGNotImplementedError) as e:
+      raise DecodeError(e, cls.name + "_DECODE_PNG")
 
     try: # and try to create a brainfuck program from it
-      self.data = self.process_input(self.png.rgb)
+      code = cls.process_input(png)
+    except (image_png.PNGNotImplementedError, zlib.error) as e:
+      raise DecodeError(e, cls.name + "_DECODE_PNG")
     except (TypeError, ValueError, KeyError, IndexError) as e:
-      std.exit_failure("BL_PROCESS_INPUT", \
-        std.create_error_msg("INTERNAL", e))
+      raise TranslateError(e, cls.name + "_PROCESS_INPUT")
+    finally:
+      png.close()
+
+    if key is not None:
+      cache_.store(key, code)
+    return code
+
+####################### CONSTRUCTOR == RUN PROGRAM ######################
+  def __init__(self, filename, engine='array', level=1, report=False, \
+               out=None, inp=None, memory=b'\x00', cache=None, \
+               step_limit=None, time_limit=None, tape_limit=None, \
+               profile=False, profile_json=None, checkpoint=None, \
+               resume=None, prefix=None, threshold=None, memo_window=None, \
+               memo_entries=None):
+    ''' Decode, parse and execute program in PNG format '''
 
-    self.program = BrainFuck(self.data)
+    try:
+      self.data = self.translate(filename, cache)
+    except DecodeError as e:
+      std.exit_failure(e.code, std.create_error_msg("PYTHON", e))
+    except TranslateError as e:
+      std.exit_failure(e.code, std.create_error_msg("INTERNAL", e))
+
+    self.program = BrainFuck(self.data, engine=engine, level=level, \
+                             report=report, out=out, inp=inp, \
+                             memory=memory, cache=cache, \
+                             step_limit=step_limit, time_limit=time_limit, \
+                             tape_limit=tape_limit, profile=profile, \
+                             profile_json=profile_json, \
+                             checkpoint=checkpoint, resume=resume, \
+                             prefix=prefix, threshold=threshold, \
+                             memo_window=memo_window, \
+                             memo_entries=memo_entries)
 
 
 
 ############################ BC INTERPRETER #############################
-class BrainCopter():
+class BrainCopter(BrainLoller):
   ''' BrainCopter programming language interpreter '''
 
-############################# CONVERT CODE TO BF ########################
-  def process_input(self, png_):
-    ''' Convert decoded PNG to BrainFuck program '''
-    
-    x = 0 # x coordinate (zero means left)
-    y = 0 # y coordinate (zero means up)
-    d = 0 # default exectuion direction (right)
-    h = len(png_) # height
-    w = len(png_[0]) # width
-    code = list() # brainfuck code
-    directions =  { # all possible directions to move in code
-                    0: lambda x, y: (x+1, y), # go right
-                    1: lambda x, y: (x, y+1), # go down
-                    2: lambda x, y: (x-1, y), # go left
-                    3: lambda x, y: (x, y-1)  # go up
-                  }
-    instruction_set = { # instructions convertable to BF instructions
-                        0: '>',
-                        1: '<',
-                        2: '+',
-                        3: '-',
-                        4: '.',
-                        5: ',',
-                        6: '[',
-                        7: ']' 
-                      }
-    direction_change =  { # instructions changing IP direction
-                          8: lambda x: (x+1)%4, # rotate right 
-                          9: lambda x: (x-1)%4  # rotate left 
-                        }
-    
-    while 0 <= y < h and 0 <= x < w:
-      i = (-2 * png_[y][x][0] + 3 * png_[y][x][1] + png_[y][x][2])%11
-      if i in instruction_set:
-        code.append(instruction_set[i])
+  name = 'BC' # prefix of error codes
 
-      if i in direction_change:
-        d = direction_change[i](d)
+############################ CLASSIFY PIXELS ############################
+  @classmethod
+  def classify(cls, L_):
+    ''' Return opcodes of pixels of line L_, (-2r + 3g + b) mod 11 '''
 
-      x, y = directions[d](x, y)
-      
-    return ''.join(code)
+    if not isinstance(L_, (bytes, bytearray)): # uint8 array
+      p = L_.reshape(-1, 3).astype(image_png.numpy.int32)
+      return ((-2 * p[:, 0] + 3 * p[:, 1] + p[:, 2]) % 11).astype( \
+        image_png.numpy.uint8).tobytes()
 
-####################### CONSTRUCTOR == RUN PROGRAM ######################
-  def __init__(self, filename):
-    ''' Decode, parse and execute program in PNG format '''
-    
-    try: # try to decode the png
-      self.png = image_png.PngReader(filename)
-    except (IOError, image_png.PNGErrorCRC32, image_png.PNGMissingIDAT,\
-      image_png.PNGMissingIEND, image_png.PNGMissingIHDR) as e:
-      std.exit_failure("BC_DECODE_PNG", \
-        std.create_error_msg("PYTHON", e))
+    return bytes((-2 * L_[j] + 3 * L_[j + 1] + L_[j + 2]) % 11 \
+      for j in range(0, len(L_), 3))
 
-    try: # and try to create a brainfuck program from it
-      self.data = self.process_input(self.png.rgb)
-    except (TypeError, ValueError, KeyError, IndexError) as e:
-      std.exit_failure("BC_PROCESS_INPUT", \
-        std.create_error_msg("INTERNAL", e))
 
-    self.program = BrainFuck(self.data)
\ No newline at end of file
+
+############################## LIBRARY API ##############################
+IMAGES = { 'L': BrainLoller, 'C': BrainCopter } # image program languages
+
+def compile(source, language='F', engine='array', level=1, cache=None, \
+            prefix=None, threshold=None, memo_window=None, memo_entries=None):
+  ''' Compile source (BrainFuck file or code itself, PNG file for language
+      L or C) into Program, raise BrainError subclass on failure '''
+
+  if language in IMAGES:
+    source = IMAGES[language].translate(source, cache)
+  elif language != 'F':
+    raise ValueError("unknown language " + str(language))
+  return Program(source, engine, level, cache, prefix, threshold, \
+                 memo_window, memo_entries)
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Flat array-backed bytecode for BrainFuck programs and its interpreter
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+'''
+
+# IMPORTS
+import std, sys, time
+from array import array
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+############################### OPCODES #################################
+HALT = 0 # stop execution
+ADD  = 1 # add arg to current cell (mod 256)
+MOVE = 2 # move memory pointer by arg (clamped at cell 0)
+OUT  = 3 # write cell at offset arg times
+IN   = 4 # read arg bytes into cell at offset
+JZ   = 5 # jump to arg if current cell is zero
+JNZ  = 6 # jump to arg if current cell is not zero
+SET  = 7 # set cell at offset to arg
+MUL  = 8 # add current cell * arg to cell at offset
+SCAN = 9 # move pointer by arg until it points to zero cell
+ADDO = 10 # add arg to cell at offset (mod 256)
+CALL = 11 # run loop compiled by the tiered engine (arg indexes .calls)
+JNZC = 12 # JNZ counting iterations down in .hits (tiered engine)
+MEMO = 13 # JZ of loop whose body is run by .enter (memo engine)
+
+op_names = { HALT: 'HALT', ADD: 'ADD', MOVE: 'MOVE', OUT: 'OUT', IN: 'IN',
+             JZ: 'JZ', JNZ: 'JNZ', SET: 'SET', MUL: 'MUL', SCAN: 'SCAN',
+             ADDO: 'ADDO', CALL: 'CALL', JNZC: 'JNZC', MEMO: 'MEMO' }
+
+LEFT_EDGE = 'memory pointer moved left of cell 0' # error in strict mode
+CHECK = 4096 # instructions between the first checks of a deadline ...
+TICK = 0.01 # ... the interval then adapts to about this many seconds
+
+########################## E - RUN LIMITS ###############################
+class LimitError(Exception):
+  ''' EXCEPTION: run exceeded its instruction budget (.kind == 'steps') or
+      its deadline ('time'), .steps instructions were executed '''
+
+  def __init__(self, kind_, steps_, limit_):
+    if kind_ == 'steps':
+      msg = 'more than {0} instructions executed'.format(limit_)
+    else:
+      msg = 'time limit exceeded after {0} instructions'.format(steps_)
+    Exception.__init__(self, msg)
+    self.kind = kind_
+    self.steps = steps_
+
+class Suspend(Exception):
+  ''' EXCEPTION: run paused because input is missing (.reason == 'input'),
+      to let others run ('slice') or to compile a hot loop ('hot'), it
+      continues by executing from .ip with .steps instructions executed
+      (state of the tape is saved) '''
+
+  def __init__(self, reason_):
+    Exception.__init__(self, 'run suspended (' + reason_ + ')')
+    self.reason = reason_
+    self.ip = None
+    self.steps = None
+
+############################## BYTECODE #################################
+class Bytecode():
+  ''' Program as parallel opcode/operand arrays with dense numbering '''
+
+  def __init__(self):
+    ''' Create empty program '''
+
+    self.ops = array('i') # opcodes
+    self.args = array('i') # operands (jump targets already resolved)
+    self.offs = array('i') # cell offsets relative to memory pointer
+    self.src = array('i') # source offset of every instruction
+    self.stdin = None # input embedded in source after ! (if any)
+    self.clamp = True # clamp pointer at cell 0 (False == raise error)
+    self.rewrites = dict() # optimizations applied to the program
+    self.prefix = None # (instructions, cells, pointer, output) evaluated
+
+  def emit(self, op_, arg_, src_, off_=0):
+    ''' Append one instruction, return its index '''
+
+    self.ops.append(op_)
+    self.args.append(arg_)
+    self.offs.append(off_)
+    self.src.append(src_)
+    return len(self.ops) - 1
+
+  def __len__(self):
+    return len(self.ops)
+
+  def dump(self):
+    ''' Return human readable listing of the program '''
+
+    return '\n'.join('{0:6} {1:>5} {2} @{3}'.format(i, op_names[self.ops[i]],
+      self.args[i], self.offs[i]) for i in range(0, len(self.ops)))
+
+############################### COMPILER ################################
+def compile_dict(code_):
+  ''' Convert program from BrainFuck.bf2dict form into Bytecode '''
+
+  bc = Bytecode()
+  addrs = sorted(k for k in code_ if k != 'stdin') # source offsets
+  index = dict((a, i) for i, a in enumerate(addrs)) # offset -> dense index
+  signs = { '>': (MOVE, 1), '<': (MOVE, -1), '+': (ADD, 1), '-': (ADD, -1),
+            '.': (OUT, 1), ',': (IN, 1) }
+
+  for a in addrs:
+    op, arg = code_[a]
+    if op in signs:
+      bc.emit(signs[op][0], signs[op][1] * arg, a)
+    elif op == '[': # jump behind the matching ]
+      bc.emit(JZ, index[arg], a)
+    elif op == ']': # jump behind the matching [
+      bc.emit(JNZ, index[arg] + 1, a)
+    else:
+      bc.emit(HALT, 0, a)
+
+  bc.stdin = code_.get('stdin')
+  return bc
+
+################################ LIMITS #################################
+def budget(limit_=None, deadline_=None):
+  ''' Return function checking limits of a run: at most limit_
+      instructions, until time.monotonic() deadline_. Engines call it with
+      the number of instructions executed (cheaply, at loop back edges)
+      once it gets over the number it returned last time. '''
+
+  limit = sys.maxsize if limit_ is None else limit_
+  every = CHECK # instructions between checks of the deadline
+  last = time.monotonic() # time of the last check
+
+  def check(n_):
+    ''' Raise LimitError or return when to be called next '''
+
+    nonlocal every, last
+    if n_ > limit:
+      raise LimitError('steps', n_, limit)
+    if deadline_ is None:
+      return limit
+    t = time.monotonic()
+    if t > deadline_:
+      raise LimitError('time', n_, deadline_)
+    if t - last < TICK: # checking too often
+      every *= 2
+    elif t - last > 2 * TICK and every > CHECK:
+      every //= 2
+    last = t
+    return min(limit, n_ + every)
+
+  return check
+
+############################## INTERPRETER ##############################
+def execute(code_, tape_, out_, in_, check_=None, ip_=0, n_=0, \
+            enter_=None):
+  ''' Run Bytecode on tape.Tape tape_ in a single dispatch loop, return
+      number of instructions executed; limits are checked by check_ (made
+      by budget); a run that raised Suspend is continued with ip_ and n_
+      set to its .ip and .steps; bodies of MEMO loops are run by enter_
+      (see memo) '''
+
+  ops = code_.ops
+  args = code_.args
+  offs = code_.offs
+  clamp = code_.clamp
+  read = in_.read # stdin
+  write = out_.write # stdout
+  m = tape_.cells # memory ...
+  p = tape_.p # ... pointer into it ...
+  L = tape_.L # ... its end ...
+  C = tape_.reserve(L) # ... and number of addressable cells
+  reserve = tape_.reserve
+  zero = tape_.zero
+  ip = ip_
+  b = ip_ # start of the straight run being executed ...
+  n = n_ # ... and instructions executed before it
+  check = check_ if check_ is not None else budget()
+
+  def left(n_, L_):
+    ''' Make room for n_ cells left of cell 0, return the shift '''
+
+    if not tape_.left:
+      raise IndexError(LEFT_EDGE)
+    return tape_.shift(n_, L_)
+
+  try:
+    due = check(n_) # instructions executed when limits are checked next
+    while 1:
+      op = ops[ip]
+      if op == ADD:
+        m[p] = (m[p] + args[ip]) & 255
+        ip += 1
+      elif op == MOVE:
+        p += args[ip]
+        if p >= L: # grow by the move length just like i_memInc
+          L += args[ip]
+          if L > C:
+            C = reserve(L)
+        elif p < 0:
+          if tape_.left:
+            k = left(-p, L)
+            p, L, C = p + k, L + k, reserve(L + k)
+          elif clamp:
+            p = 0
+          else:
+            raise IndexError(LEFT_EDGE)
+        ip += 1
+      elif op == JNZ:
+        n += ip - b + 1 # instructions are counted per straight run
+        if m[p]:
+          ip = args[ip]
+        else:
+          ip += 1
+        b = ip
+        if n > due:
+          tape_.p, tape_.L = p, L
+          due = check(n)
+      elif op == JZ:
+        n += ip - b + 1
+        if m[p]:
+          ip += 1
+        else:
+          ip = args[ip]
+        b = ip
+        if n > due:
+          tape_.p, tape_.L = p, L
+          due = check(n)
+      elif op == ADDO:
+        q = p + offs[ip]
+        if q >= L:
+          L = q + 1
+          if L > C:
+            C = reserve(L)
+        elif q < 0:
+          k = left(-q, L)
+          p, q, L, C = p + k, q + k, L + k, reserve(L + k)
+        m[q] = (m[q] + args[ip]) & 255
+        ip += 1
+      elif op == SET:
+        q = p + offs[ip]
+        if q >= L:
+          L = q + 1
+          if L > C:
+            C = reserve(L)
+        elif q < 0:
+          k = left(-q, L)
+          p, q, L, C = p + k, q + k, L + k, reserve(L + k)
+        m[q] = args[ip]
+        ip += 1
+      elif op == MUL:
+        v = m[p]
+        if v:
+          q = p + offs[ip]
+          if q >= L:
+            L = q + 1
+            if L > C:
+              C = reserve(L)
+          elif q < 0:
+            k = left(-q, L)
+            p, q, L, C = p + k, q + k, L + k, reserve(L + k)
+          m[q] = (m[q] + v * args[ip]) & 255
+        ip += 1
+      elif op == SCAN:
+        a = args[ip]
+        q = zero(p, a)
+        if a > 0 and not 0 <= q < L: # ran off the end, grow like > would
+          p += ((L - p + a - 1) // a) * a
+          L += a
+          if L > C:
+            C = reserve(L)
+          ip += 1
+        elif q >= 0:
+          p = q
+          ip += 1
+        elif tape_.left: # make room on the left, rerun the scan
+          k = left(-a, L)
+          p, L, C = p + k, L + k, reserve(L + k)
+        elif clamp: # stuck at cell 0, rerun the scan from there
+          p = 0
+          n += ip - b + 1 # every rerun counts, limits can stop it
+          b = ip
+          if n > due:
+            tape_.p, tape_.L = p, L
+            due = check(n)
+        else:
+          raise IndexError(LEFT_EDGE)
+      elif op == OUT:
+        q = p + offs[ip]
+        if q >= L:
+          L = q + 1
+          if L > C:
+            C = reserve(L)
+        elif q < 0:
+          k = left(-q, L)
+          p, q, L, C = p + k, q + k, L + k, reserve(L + k)
+        write(chr(m[q]) * args[ip])
+        ip += 1
+      elif op == IN:
+        q = p + offs[ip]
+        if q >= L:
+          L = q + 1
+          if L > C:
+            C = reserve(L)
+        elif q < 0:
+          k = left(-q, L)
+          p, q, L, C = p + k, q + k, L + k, reserve(L + k)
+        m[q] = read(args[ip], m[q])
+        ip += 1
+      elif op == CALL:
+        n += ip - b + 1 # the loop counts its iterations itself
+        code_.hits[ip] += 1 # calls
+        f, ip, j = code_.calls[args[ip]]
+        b = ip
+        tape_.p, tape_.L = p, L
+        try:
+          p, L, n, due = f(m, p, L, write, read, n, due)
+        except BaseException: # the loop kept its state in the tape
+          p, L = tape_.p, tape_.L
+          raise
+      elif op == JNZC:
+        n += ip - b + 1
+        if m[p]:
+          code_.hits[ip] -= 1
+          if not code_.hits[ip]: # hot, continue in compiled code
+            ip = b = args[ip]
+            raise Suspend('hot')
+          ip = args[ip]
+        else:
+          ip += 1
+        b = ip
+        if n > due:
+          tape_.p, tape_.L = p, L
+          due = check(n)
+      elif op == MEMO: # JZ, memoized loop body
+        n += ip - b + 1
+        tape_.p, tape_.L = p, L
+        if n > due:
+          due = check(n)
+        if m[p]:
+          try:
+            n = enter_(code_.memo[ip], n, due)
+          finally: # the body kept its state in the tape (even failing)
+            p, L = tape_.p, tape_.L
+          if L > C:
+            C = reserve(L)
+        ip = b = args[ip]
+      else:
+        break
+    tape_.p = p
+    tape_.L = L
+    if n + ip - b > due: # instructions executed (HALT excluded)
+      check(n + ip - b)
+  except Suspend as e: # at a jump (already taken) or , (not executed)
+    tape_.p, tape_.L = p, L
+    e.ip, e.steps = ip, n + ip - b
+    raise
+  except BaseException: # keep the state for inspection
+    if p < 0: # move left of cell 0 failed, undo it
+      p -= args[ip]
+    tape_.p, tape_.L = p, min(L, len(m))
+    raise
+
+  return n + ip - b
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "BYTECODE can only be imported, not run!")
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  On-disk cache of compiled BrainFuck programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Entries are marshalled internal forms (the dict of the dict engine or
+  optimized Bytecode of the other engines) named by a hash of the source,
+  the form, the optimization level and versions of everything involved
+  (residuals of evaluated prefixes are stored like Bytecode).
+  Writes go through a temporary file renamed into place, so concurrent
+  processes never see half written entries. Least recently used entries
+  are removed once the directory grows over its size limit. Hit/miss
+  counters of all processes are summed in the file "stats".
+  Memory keeps packed programs in a process (workers of a daemon) in front
+  of an optional Cache, so repeated runs do not even read the directory.
+'''
+
+# IMPORTS
+import std, os, sys, hashlib, marshal, tempfile, bytecode, optimizer
+from collections import OrderedDict
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+FORMAT = 1 # version of the entry layout
+LIMIT = 256 << 20 # default size limit of the cache directory in bytes
+CHUNK = 1 << 20 # bytes of source hashed at once
+SUFFIX = '.bfc' # cache entry file name suffix
+COUNTERS = ('hits', 'misses', 'stores', 'evictions')
+ENTRIES = 1024 # programs kept by a Memory
+
+################################# CACHE #################################
+class Cache():
+  ''' Directory of compiled programs '''
+
+  def __init__(self, path_, limit_=LIMIT, rebuild_=False):
+    ''' Use (and create) directory path_, keep it under limit_ bytes,
+        with rebuild_ ignore stored entries (and replace them) '''
+
+    if limit_ < 1:
+      raise ValueError("cache size limit must be positive")
+    self.path = path_
+    self.limit = limit_
+    self.rebuild = rebuild_
+    self.counters = dict((c, 0) for c in COUNTERS) # not saved yet
+    self.lookups = list() # (form, 'hit' or 'miss') of this process
+    os.makedirs(path_, exist_ok=True)
+
+  def key(self, source_, form_, level_):
+    ''' Return key of source_ (file, source code or clean code) compiled into
+        form_ ('dict' or 'bytecode' or 'BL'/'BC' for BrainFuck code of
+        image programs) at optimization level_ '''
+
+    h = hashlib.sha256('{0} {1} {2} {3} {4} {5} {6}\n'.format(FORMAT, \
+      std.__version__, optimizer.VERSION, marshal.version, \
+      sys.byteorder, form_, level_).encode('ascii'))
+    if isinstance(source_, bytes): # clean code
+      h.update(source_)
+    elif os.path.isfile(source_):
+      with open(source_, 'rb') as f:
+        for c in iter(lambda: f.read(CHUNK), b''):
+          h.update(c)
+    else:
+      h.update(source_.encode('utf-8', 'surrogateescape'))
+    return h.hexdigest()
+
+  def file(self, key_):
+    ''' Path of entry key_ '''
+
+    return os.path.join(self.path, key_ + SUFFIX)
+
+  def load(self, key_, form_=None):
+    ''' Return program stored under key_ (of form_) or None '''
+
+    try:
+      if self.rebuild:
+        raise KeyError(key_)
+      with open(self.file(key_), 'rb') as f:
+        code = unpack(marshal.load(f))
+      os.utime(self.file(key_)) # recently used
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+      self.counters['misses'] += 1
+      self.lookups.append((form_, 'miss'))
+      return None
+
+    self.counters['hits'] += 1
+    self.lookups.append((form_, 'hit'))
+    return code
+
+  def store(self, key_, code_):
+    ''' Save program code_ under key_, evict old entries if needed '''
+
+    fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        marshal.dump(pack(code_), f)
+      os.replace(tmp, self.file(key_)) # atomic
+    except BaseException:
+      os.unlink(tmp)
+      raise
+
+    self.counters['stores'] += 1
+    self.evict()
+
+  def evict(self):
+    ''' Remove least recently used entries over the size limit '''
+
+    entries = list()
+    for e in os.scandir(self.path):
+      if e.name.endswith(SUFFIX):
+        try:
+          s = e.stat()
+        except OSError: # removed by another process meanwhile
+          continue
+        entries.append((s.st_mtime, s.st_size, e.path))
+
+    total = sum(e[1] for e in entries)
+    for t, size, path in sorted(entries):
+      if total <= self.limit:
+        break
+      try:
+        os.unlink(path)
+        self.counters['evictions'] += 1
+      except OSError:
+        pass
+      total -= size
+
+  def stats(self):
+    ''' Return counters of all processes (including unsaved ones) '''
+
+    try:
+      with open(os.path.join(self.path, 'stats'), 'rb') as f:
+        saved = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+      saved = dict()
+    return dict((c, saved.get(c, 0) + self.counters[c]) for c in COUNTERS)
+
+  def close(self):
+    ''' Add counters to the stats file (updates may get lost when many
+        processes close at once, the file never gets corrupted) '''
+
+    if not any(self.counters.values()):
+      return
+    total = self.stats()
+    fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+      marshal.dump(total, f)
+    os.replace(tmp, os.path.join(self.path, 'stats'))
+    self.counters = dict((c, 0) for c in COUNTERS)
+
+################################ MEMORY #################################
+class Memory():
+  ''' Compiled programs kept in memory (least recently used go first), in
+      front of the Cache of the current run if it has one '''
+
+  def __init__(self, entries_=ENTRIES):
+    if entries_ < 1:
+      raise ValueError("memory cache entries must be positive")
+    self.entries = entries_
+    self.programs = OrderedDict() # key -> packed program
+    self.back = None # Cache of the current run
+    self.rebuild = False
+    self.counters = dict((c, 0) for c in COUNTERS)
+    self.lookups = list() # (form, 'hit' or 'miss') of the current run
+
+  key = Cache.key # the very same keys as the directory
+
+  def over(self, back_=None, rebuild_=False):
+    ''' Start a run with Cache back_ (or None) behind the memory, with
+        rebuild_ ignore stored entries; return self '''
+
+    self.back = back_
+    self.rebuild = rebuild_
+    self.lookups = list()
+    return self
+
+  def load(self, key_, form_=None):
+    ''' Return program stored under key_ (of form_) or None '''
+
+    code = None if self.rebuild else self.programs.get(key_)
+    if code is not None:
+      self.programs.move_to_end(key_)
+      self.counters['hits'] += 1
+      self.lookups.append((form_, 'hit'))
+      return unpack(code)
+
+    self.counters['misses'] += 1
+    if self.back is None:
+      self.lookups.append((form_, 'miss'))
+      return None
+    ret = self.back.load(key_, form_)
+    self.lookups.append(self.back.lookups[-1])
+    if ret is not None:
+      self.keep(key_, ret)
+    return ret
+
+  def store(self, key_, code_):
+    ''' Keep program code_ under key_ (and save it into the Cache) '''
+
+    self.keep(key_, code_)
+    if self.back is not None:
+      self.back.store(key_, code_)
+
+  def keep(self, key_, code_):
+    ''' Put program code_ into memory, forget old ones if needed '''
+
+    self.programs[key_] = pack(code_) # runs get copies, not shared code
+    self.programs.move_to_end(key_)
+    self.counters['stores'] += 1
+    while len(self.programs) > self.entries:
+      self.programs.popitem(last=False)
+      self.counters['evictions'] += 1
+
+  def stats(self):
+    ''' Return counters of the memory (memory_*) and of the Cache '''
+
+    ret = dict(('memory_' + c, v) for c, v in self.counters.items())
+    if self.back is not None:
+      ret.update(self.back.stats())
+    return ret
+
+  def close(self):
+    ''' End the run, close its Cache (its counters stay available) '''
+
+    if self.back is not None:
+      self.back.close()
+
+############################# SERIALIZATION #############################
+def pack(code_):
+  ''' Convert program into something marshal can store '''
+
+  if isinstance(code_, bytes): # BrainFuck code of an image program
+    return ('code', code_)
+  if isinstance(code_, bytecode.Bytecode):
+    ret = ('bytecode', code_.ops.tobytes(), code_.args.tobytes(), \
+      code_.offs.tobytes(), code_.src.tobytes(), stdin(code_.stdin), \
+      code_.clamp, code_.rewrites)
+    return ret if code_.prefix is None else ret + (code_.prefix,)
+
+  code = dict(code_)
+  if 'stdin' in code:
+    code['stdin'] = stdin(code['stdin'])
+  return ('dict', code)
+
+def unpack(data_):
+  ''' Convert data_ made by pack back into program '''
+
+  if data_[0] in ('dict', 'code'):
+    return data_[1]
+  if data_[0] != 'bytecode':
+    raise ValueError("unknown cache entry")
+
+  bc = bytecode.Bytecode()
+  for a, b in zip((bc.ops, bc.args, bc.offs, bc.src), data_[1:5]):
+    a.frombytes(b)
+  bc.stdin, bc.clamp, bc.rewrites = data_[5:8]
+  if len(data_) > 8: # residual of an evaluated prefix (see partial)
+    bc.prefix = data_[8]
+  return bc
+
+def stdin(data_):
+  ''' Embedded input in a form marshal can store '''
+
+  return data_ if data_ is None or isinstance(data_, str) else bytes(data_)
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "CACHE can only be imported, not run!")
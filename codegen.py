@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  BrainFuck bytecode to Python source translator (ahead-of-time engine)
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+'''
+
+# IMPORTS
+import std
+from bytecode import HALT, ADD, ADDO, MOVE, OUT, IN, JZ, JNZ, SET, MUL, \
+                     SCAN, LEFT_EDGE, budget
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+MAX_DEPTH = 16 # CPython allows only 20 statically nested blocks
+MAX_LINES = 1000 # compile() gets slow on huge functions, split them
+ARGS = 'm, p, L, put, get' # arguments of every generated function ...
+RETS = 'p, L' # ... and what it returns
+LIMITS = ', n, due' # added to both when limits are checked
+
+############################ RUNTIME HELPERS ############################
+def helpers(tape_, clamp_, check_=None):
+  ''' Return runtime helpers of generated code working on tape_, limits
+      are checked by check_ (see bytecode.budget) '''
+
+  def keep(p_, L_):
+    ''' Store state of the run (for inspection after an error) '''
+
+    tape_.p, tape_.L = p_, min(L_, len(tape_.cells))
+
+  def fit(n_, p_, L_):
+    ''' Make first n_ cells addressable '''
+
+    try:
+      tape_.reserve(n_)
+    except MemoryError: # tape limit
+      keep(p_, L_)
+      raise
+
+  def shift(n_, p_, L_, a_=0):
+    ''' Make room for n_ cells left of cell 0, return pointer, end; a_ is
+        the move that took the pointer to p_ (undone on failure) '''
+
+    if not tape_.left:
+      keep(p_ - a_, L_)
+      raise IndexError(LEFT_EDGE)
+    try:
+      k = tape_.shift(n_, L_)
+    except MemoryError:
+      keep(p_ - a_, L_)
+      raise
+    return p_ + k, L_ + k
+
+  def left(p_, L_, a_):
+    ''' Pointer moved by a_ left of cell 0, return new pointer and end '''
+
+    if tape_.left:
+      return shift(-p_, p_, L_, a_)
+    if not clamp_:
+      keep(p_ - a_, L_)
+      raise IndexError(LEFT_EDGE)
+    return 0, L_
+
+  def grow(q_, p_, L_):
+    ''' Make cell q_ addressable, return new pointer and end '''
+
+    if q_ < 0:
+      return shift(-q_, p_, L_)
+    if q_ >= L_:
+      fit(q_ + 1, p_, L_)
+      return p_, q_ + 1
+    return p_, L_
+
+  def more(L_, p_):
+    ''' Memory end moved right to L_ (pointer p_), return it '''
+
+    fit(L_, p_, L_)
+    return L_
+
+  def scan(p_, L_, a_, n_=None, due_=None):
+    ''' SCAN instruction, return new pointer and end; code counting
+        instructions passes n_ and due_ and gets them back too, so a scan
+        stuck at cell 0 counts its reruns and limits can stop it '''
+
+    while 1:
+      q = tape_.zero(p_, a_)
+      if a_ > 0 and not 0 <= q < L_: # ran off the end, grow like > would
+        p_ += ((L_ - p_ + a_ - 1) // a_) * a_
+        fit(L_ + a_, p_, L_)
+        return p_, L_ + a_
+      if q >= 0:
+        return (q, L_) if n_ is None else (q, L_, n_, due_)
+      if tape_.left:
+        p_, L_ = shift(-a_, p_, L_)
+      elif not clamp_:
+        keep(p_, L_)
+        raise IndexError(LEFT_EDGE)
+      else:
+        p_ = 0 # stuck at cell 0 forever (unless it is zero)
+        if n_ is not None:
+          n_ += 1
+          if n_ > due_:
+            due_ = tick(n_, p_, L_)
+
+  def tick(n_, p_, L_):
+    ''' Check limits at n_ instructions, return when to check next '''
+
+    keep(p_, L_)
+    return check_(n_)
+
+  return { 'left': left, 'grow': grow, 'more': more, 'scan': scan,
+           'tick': tick }
+
+############################ PROGRAM WRAPPER ############################
+class PyProgram():
+  ''' Bytecode translated to Python and compiled to a code object '''
+
+  def __init__(self, code_, source_, top_=None):
+    ''' Compile source_ generated from Bytecode code_, top_ is the number
+        of instructions outside loops if the source counts the others '''
+
+    self.source = source_ # generated Python source
+    self.top = top_
+    self.stdin = code_.stdin
+    self.clamp = code_.clamp
+    self.rewrites = code_.rewrites
+    self.code = compile(source_, '<bf>', 'exec')
+
+  def __len__(self):
+    return len(self.source)
+
+############################### GENERATOR ###############################
+def cell(o_):
+  ''' Python expression addressing cell at offset o_ '''
+
+  if o_ == 0:
+    return 'p'
+  return 'p + {0}'.format(o_) if o_ > 0 else 'p - {0}'.format(-o_)
+
+def translate(code_, limits_=False, profile_=False):
+  ''' Translate Bytecode into PyProgram, with limits_ count instructions
+      executed and check limits once per loop iteration, with profile_
+      count iterations of every loop in prof[index of its JZ] '''
+
+  funcs = list() # finished helper functions
+  stack = list() # [name, lines, depth] of functions being generated
+  a_args = ARGS + LIMITS if limits_ else ARGS
+  rets = RETS + LIMITS if limits_ else RETS
+  fn = ['_bf_main', ['def _bf_main(' + a_args + '):'], 1]
+  ops, args, offs = code_.ops, code_.args, code_.offs
+  counts = [0] # instructions of every open loop (its iteration) and top
+  pieces = list() # names of functions running long straight code at top
+
+  def piece(fn_):
+    ''' Finish top level function fn_ as the next of pieces '''
+
+    name = '_bf_top_{0}'.format(len(pieces))
+    fn_[1][0] = 'def {0}({1}):'.format(name, a_args)
+    fn_[1].append('  return ' + rets)
+    funcs.append('\n'.join(fn_[1]))
+    pieces.append(name)
+
+  for i in range(0, len(code_)):
+    op, a, o = ops[i], args[i], offs[i]
+    lines = fn[1]
+    ind = '  ' * fn[2]
+    q = cell(o)
+
+    if op != HALT: # a loop iteration runs its body and the jump back
+      counts[-1] += 1
+
+    if o and op in (ADDO, SET, MUL, OUT, IN): # make the cell addressable
+      chk = ind + 'if not 0 <= {0} < L: p, L = grow({0}, p, L)'.format(q)
+    else:
+      chk = None
+
+    if op == ADD:
+      lines.append(ind + 'm[p] = (m[p] + {0}) & 255'.format(a))
+    elif op == ADDO:
+      lines.append(chk)
+      lines.append(ind + 'm[{0}] = (m[{0}] + {1}) & 255'.format(q, a))
+    elif op == MOVE:
+      lines.append(ind + 'p += {0}'.format(a))
+      if a > 0:
+        lines.append(ind + 'if p >= L: L = more(L + {0}, p)'.format(a))
+      else:
+        lines.append(ind + 'if p < 0: p, L = left(p, L, {0})'.format(a))
+    elif op == SET:
+      if chk:
+        lines.append(chk)
+      lines.append(ind + 'm[{0}] = {1}'.format(q, a))
+    elif op == MUL:
+      lines.append(ind + 'if m[p]:')
+      if chk:
+        lines.append('  ' + chk)
+      lines.append(ind + '  m[{0}] = (m[{0}] + m[p] * {1}) & 255'.format(q, a))
+    elif op == SCAN:
+      if limits_ and a < 0: # the scan may count reruns
+        lines.append(ind + 'p, L, n, due = scan(p, L, {0}, n, due)'.format(a))
+      else:
+        lines.append(ind + 'p, L = scan(p, L, {0})'.format(a))
+    elif op == OUT:
+      if chk:
+        lines.append(chk)
+      lines.append(ind + 'put(chr(m[{0}]) * {1})'.format(q, a))
+    elif op == IN:
+      if chk:
+        lines.append(chk)
+      lines.append(ind + 'm[{0}] = get({1}, m[{0}])'.format(q, a))
+    elif op == JZ:
+      if fn[2] >= MAX_DEPTH or len(lines) > MAX_LINES: # new function
+        name = '_bf_{0}'.format(i)
+        lines.append(ind + '{0} = {1}({2})'.format(rets, name, a_args))
+        stack.append(fn)
+        fn = [name, ['def {0}({1}):'.format(name, a_args)], 1]
+        ind = '  '
+        fn[1].append(ind + 'while m[p]:')
+      else:
+        lines.append(ind + 'while m[p]:')
+      fn[2] += 1
+      counts.append(0)
+      if profile_:
+        fn[1].append('  ' * fn[2] + 'prof[{0}] += 1'.format(i))
+    elif op == JNZ:
+      c = counts.pop()
+      if limits_: # count the iteration, check limits now and then
+        fn[1].append(ind + 'n += {0}'.format(c))
+        fn[1].append(ind + 'if n > due: due = tick(n, p, L)')
+      if fn[1][-1].endswith('while m[p]:'): # empty loop body
+        fn[1][-1] += ' pass'
+      fn[2] -= 1
+      if fn[2] == 1 and stack: # end of a helper function
+        fn[1].append('  return ' + rets)
+        funcs.append('\n'.join(fn[1]))
+        fn = stack.pop()
+    else:
+      break
+
+    if fn[2] == 1 and len(fn[1]) > MAX_LINES: # long straight code at top
+      piece(fn)
+      fn = ['_bf_main', ['def _bf_main(' + a_args + '):'], 1]
+
+  if pieces: # main calls the pieces one after another (no nested frames)
+    piece(fn)
+    fn = ['_bf_main', ['def _bf_main(' + a_args + '):'] + \
+      ['  {0} = {1}({2})'.format(rets, f, a_args) for f in pieces], 1]
+  fn[1].append('  return ' + rets)
+  funcs.append('\n'.join(fn[1]))
+  return PyProgram(code_, '\n\n'.join(reversed(funcs)) + '\n', \
+                   counts[0] if limits_ else None)
+
+############################### EXECUTION ###############################
+def execute(prog_, tape_, out_, in_, check_=None, prof_=None):
+  ''' Run PyProgram on tape.Tape tape_, return number of instructions
+      executed (None if prog_ does not count them); limits are checked by
+      check_ (see bytecode.budget) if prog_ was translated with limits,
+      loop iterations are counted in list prof_ if it was profiled '''
+
+  check = check_ if check_ is not None else budget()
+  env = helpers(tape_, prog_.clamp, check)
+  env['prof'] = prof_
+  exec(prog_.code, env)
+  tape_.reserve(tape_.L)
+  if prog_.top is None:
+    tape_.p, tape_.L = env['_bf_main'](tape_.cells, tape_.p, tape_.L, \
+                                       out_.write, in_.read)
+    return None
+
+  tape_.p, tape_.L, n, due = env['_bf_main'](tape_.cells, tape_.p, \
+    tape_.L, out_.write, in_.read, 0, check(0))
+  if n + prog_.top > due: # instructions outside loops are added now
+    check(n + prog_.top)
+  return n + prog_.top
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "CODEGEN can only be imported, not run!")
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Daemon of warm workers running BrainFuck programs for the command line
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  The daemon listens on a Unix socket, a pool of worker processes forked
+  from it accepts runs. A client (the command line with $BF_DAEMON set to
+  the socket) sends its arguments, working directory and environment and
+  passes its stdin, stdout and stderr along (SCM_RIGHTS); a worker runs
+  them exactly like the command line would, on the descriptors of the
+  client, and sends back the exit code. Workers have everything imported
+  and keep compiled programs and programs extracted from images in memory
+  (cache.Memory, in front of -c), so a run pays neither for the startup
+  nor for compilation; sources given to the daemon are compiled before
+  the workers are forked. A client that finds no daemon runs the program
+  itself, a client that gets interrupted interrupts its run.
+  Clients import nothing but this module, the daemon imports the rest.
+'''
+
+# IMPORTS
+import std, os, sys, stat, socket, struct, marshal, signal, threading, \
+       traceback
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+ENV = 'BF_DAEMON' # variable holding the socket clients use
+FORMAT = 1 # version of requests
+HEADER = struct.Struct('!I') # length of a request, exit code of a run
+STDIO = (0, 1, 2) # descriptors passed to workers
+BACKLOG = 128 # clients waiting for a worker
+BUFSIZE = 65536 # bytes of terminal input copied at once
+ORPHAN = 5.0 # seconds between checks whether the daemon still lives
+warm = None # cache.Memory of a worker process, None elsewhere
+
+################################ CLIENT #################################
+def receive(s_, n_):
+  ''' Return n_ bytes read from socket s_, None if it got closed first '''
+
+  ret = bytearray()
+  while len(ret) < n_:
+    data = s_.recv(n_ - len(ret))
+    if not data:
+      return None
+    ret += data
+  return bytes(ret)
+
+def forward(argv_):
+  ''' Run command line argv_ in the daemon on socket $BF_DAEMON, return
+      its exit code, None if there is no daemon (or this is a worker) '''
+
+  path = os.environ.get(ENV)
+  if not path or warm is not None:
+    return None
+  s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  fds, pipe = list(STDIO), None
+  try:
+    s.connect(path)
+    if os.isatty(0): # a worker cannot read a terminal it does not control
+      pipe = os.pipe()
+      fds[0] = pipe[0]
+    data = marshal.dumps((FORMAT, list(argv_), os.getcwd(), \
+                          dict(os.environ)))
+    socket.send_fds(s, [HEADER.pack(len(data))], fds)
+    s.sendall(data)
+  except OSError: # no daemon (or no descriptors to pass), run here
+    s.close()
+    return None
+  finally:
+    if pipe is not None:
+      os.close(pipe[0])
+
+  if pipe is not None:
+    threading.Thread(target=copy, args=(pipe[1],), daemon=True).start()
+  try:
+    code = receive(s, HEADER.size)
+  except OSError:
+    code = None
+  finally:
+    s.close()
+  if code is None:
+    print(std.create_error_msg("PYTHON", "daemon on " + path + \
+          " ended the run"), file=sys.stderr)
+    return std.EXIT_CODES["INVALID_CODE"]
+  return HEADER.unpack(code)[0]
+
+def copy(fd_):
+  ''' Copy terminal input to descriptor fd_ (pipe read by a worker) '''
+
+  try:
+    for data in iter(lambda: os.read(0, BUFSIZE), b''):
+      while data:
+        data = data[os.write(fd_, data):]
+  except OSError: # run ended meanwhile
+    pass
+  os.close(fd_)
+
+################################ WORKER #################################
+def request(conn_):
+  ''' Return (arguments, directory, environment, descriptors) of the run
+      a client sends through socket conn_, raise ValueError if it is not
+      one '''
+
+  msg, fds, flags, addr = socket.recv_fds(conn_, HEADER.size, len(STDIO))
+  try:
+    if len(msg) != HEADER.size or len(fds) != len(STDIO):
+      raise ValueError("incomplete request")
+    data = receive(conn_, HEADER.unpack(msg)[0])
+    if data is None:
+      raise ValueError("incomplete request")
+    r = marshal.loads(data)
+    if not isinstance(r, tuple) or len(r) != 4 or r[0] != FORMAT:
+      raise ValueError("unknown request")
+  except BaseException:
+    for fd in fds:
+      os.close(fd)
+    raise
+  return r[1], r[2], r[3], fds
+
+def execute(conn_, run_):
+  ''' Run the command line sent through socket conn_ by run_ with the
+      descriptors, directory and environment of the client, send back its
+      exit code (nothing if the client went away and the run got
+      interrupted) '''
+
+  try:
+    argv, cwd, env, fds = request(conn_)
+  except (OSError, ValueError, EOFError, TypeError):
+    return
+  main = threading.get_ident()
+  lock = threading.Lock()
+  running = True
+
+  def watch():
+    ''' Interrupt the run when the client closes the connection '''
+
+    try:
+      conn_.recv(1) # clients send nothing more
+    except OSError:
+      pass
+    with lock:
+      if running:
+        signal.pthread_kill(main, signal.SIGINT)
+
+  old = (sys.argv, os.getcwd(), dict(os.environ), sys.stdin, sys.stdout, \
+         sys.stderr)
+  saved = [os.dup(fd) for fd in STDIO]
+  code = 1
+  try:
+    for fd, c in zip(STDIO, fds):
+      os.dup2(c, fd)
+    sys.stdin = open(0, 'r', closefd=False) # nothing buffered by others
+    sys.stdout = open(1, 'w', closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, closefd=False)
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(env)
+    sys.argv = argv
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+      try:
+        run_()
+        code = 0
+      finally:
+        with lock:
+          running = False
+    except SystemExit as e: # like the interpreter exiting
+      if e.code is None or isinstance(e.code, int):
+        code = e.code or 0
+      else:
+        print(e.code, file=sys.stderr)
+    except KeyboardInterrupt: # the client is gone
+      code = None
+    except Exception:
+      traceback.print_exc()
+  finally:
+    for f in (sys.stdin, sys.stdout, sys.stderr):
+      try:
+        f.close()
+      except (OSError, ValueError): # client closed its end
+        pass
+    sys.argv, sys.stdin, sys.stdout, sys.stderr = old[0], *old[3:]
+    for fd, c in zip(STDIO, saved):
+      os.dup2(c, fd)
+      os.close(c)
+    for c in fds:
+      os.close(c)
+    os.chdir(old[1])
+    os.environ.clear()
+    os.environ.update(old[2])
+
+  try:
+    if code is not None:
+      conn_.sendall(HEADER.pack(code & 0xFFFFFFFF))
+    conn_.shutdown(socket.SHUT_RDWR) # wakes the watcher
+  except OSError:
+    pass
+
+def worker(s_, run_):
+  ''' Serve runs accepted on listening socket s_ by run_ (__main__.run)
+      until killed (or the daemon is gone), never return '''
+
+  parent = os.getppid()
+  try:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    s_.settimeout(ORPHAN)
+    while os.getppid() == parent: # the daemon got killed otherwise
+      try:
+        conn, addr = s_.accept()
+      except socket.timeout:
+        continue
+      conn.settimeout(None)
+      with conn:
+        execute(conn, run_)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    os._exit(0)
+
+################################ DAEMON #################################
+def listen(path_):
+  ''' Return socket listening on path_, replace a stale socket file, raise
+      OSError if a daemon listens there already '''
+
+  try:
+    if stat.S_ISSOCK(os.stat(path_).st_mode):
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        if not s.connect_ex(path_):
+          raise OSError("a daemon is running on " + path_)
+      os.unlink(path_)
+  except FileNotFoundError:
+    pass
+  s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    s.bind(path_)
+    s.listen(BACKLOG)
+  except OSError:
+    s.close()
+    raise
+  return s
+
+def stop(signum_, frame_):
+  ''' SIGTERM handler of the daemon '''
+
+  sys.exit(0)
+
+def main(a_, run_):
+  ''' Compile sources of parsed arguments a_ (at its -t, -O, -e and -p),
+      serve runs of clients by run_ (__main__.run) on socket a_['daemon']
+      with a_['workers'] worker processes until interrupted '''
+
+  global warm
+  import brainx, cache, batch # clients need none of them
+  if warm is not None:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", \
+      "a daemon cannot be started by a worker of a daemon (unset $" + \
+      ENV + ")"))
+
+  warm = cache.Memory()
+  c = None
+  try:
+    if a_['cache'] and not a_['no_cache']:
+      c = cache.Cache(a_['cache'], a_['cache_limit'], a_['rebuild_cache'])
+    warm.over(c, a_['rebuild_cache'])
+    for p, t in batch.collect(a_['source'], a_['type']):
+      try:
+        brainx.compile(p, t, 'dict' if a_['engine'] == 'dict' else 'array', \
+                       a_['optimize'], warm, a_['prefix'])
+      except brainx.BrainError as e: # clients get the error themselves
+        print(std.create_error_msg("PYTHON", e, True), file=sys.stderr)
+    path = os.path.abspath(a_['daemon'])
+    s = listen(path)
+  except (ValueError, OSError) as e:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", e))
+  finally:
+    warm.close()
+    warm.over()
+
+  pids = set()
+  signal.signal(signal.SIGTERM, stop)
+  try:
+    print('daemon of {0} workers, {1} programs compiled, on {2}'.format( \
+          a_['workers'], len(warm.programs), path), file=sys.stderr, \
+          flush=True)
+    while 1:
+      while len(pids) < a_['workers']: # at start and when a run killed one
+        pid = os.fork()
+        if not pid:
+          worker(s, run_)
+        pids.add(pid)
+      pids.discard(os.wait()[0])
+  except (KeyboardInterrupt, SystemExit):
+    pass
+  finally:
+    for pid in pids:
+      try:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+      except OSError:
+        pass
+    s.close()
+    try:
+      os.unlink(path)
+    except OSError:
+      pass
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "DAEMON can only be imported, not run!")
@@ -3,7 +3,12 @@
 ''' Simple PNG files parser; author: nzt4567; year: 2012/2013 '''
 
 # IMPORTS
-import std, zlib
+import std, zlib, mmap
+
+try:
+  import numpy
+except ImportError: # optional, pure Python unfiltering is used without it
+  numpy = None
 
 # CREDITS
 __author__  = std.__author__
@@ -13,6 +18,8 @@ __version__ = std.__version__
 __license__ = std.__license__
 __year__    = std.__year__
 
+CHUNK = 1 << 16 # max bytes decompressed at once
+
 ######################### E - WRONG PNG HEADER ##########################
 class PNGWrongHeaderError(Exception):
   ''' EXCEPTION: file does not have a png header '''
@@ -49,6 +56,8 @@ class PNGNotImplementedError(Exception):
 class PngReader():
   ''' Parse png file and return list of it's pixels '''
 
+  bpp = 3 # bytes per pixel (8 bit RGB is the only supported format)
+
 ###### PREDICTOR - http://www.w3.org/TR/PNG/#9Filter-type-4-Paeth #######
   def paeth(self, a_, b_, c_):
     ''' Paeth pixel predictor '''
@@ -66,53 +75,58 @@ class PngReader():
       return c_
 
 ######## NONE FILTER - http://www.w3.org/TR/PNG/#9Filter-types ##########
-  def sf_0(self, L_, p_, w_):
+  def sf_0(self, L_, p_):
     ''' Scanline filter 0 - None '''
 
     return L_ # same line - filter does nothing
 
 ######## SUB FILTER - http://www.w3.org/TR/PNG/#9Filter-types ###########
-  def sf_1(self, L_, p_, w_):
+  def sf_1(self, L_, p_):
     ''' Scanline filter 1 - Sub '''
 
-    nl = [L_[0]]  # new line after applying filter
-
-    for i in range(1, w_):
-      nl.append(tuple(map(lambda x,y: (x+y)%256, L_[i], nl[i-1])))
+    for i in range(self.bpp, len(L_)): # bytes of the pixel to the left
+      L_[i] = (L_[i] + L_[i - self.bpp]) & 255
 
-    return nl # new line after applying filter
+    return L_ # new line after applying filter
 
 ######### UP FILTER - http://www.w3.org/TR/PNG/#9Filter-types ###########
-  def sf_2(self, L_, p_, w_):
+  def sf_2(self, L_, p_):
     ''' Scanline filter 2 - Up '''
 
-    return [tuple(map(lambda x,y: (x+y)%256, L_[i], p_[i])) \
-      for i in range(0, w_)] # new line after applying filter
+    return bytearray((x + y) & 255 for x, y in zip(L_, p_))
 
 ### AVERAGE FILTER - http://www.w3.org/TR/PNG/#9Filter-type-3-Average ###
-  def sf_3(self, L_, p_, w_):
+  def sf_3(self, L_, p_):
     ''' Scanline filter 3 - Average '''
 
-    nl = [tuple(map(lambda x,y: (x+(y//2))%256, L_[0], p_[0]))]
-    
-    for i in range(1, w_):
-      nl.append(tuple(map(lambda x,y,z: (x+((y+z)//2))%256, L_[i], \
-        nl[i-1], p_[i])))
+    b = self.bpp
+    for i in range(0, b):
+      L_[i] = (L_[i] + (p_[i] >> 1)) & 255
+    for i in range(b, len(L_)):
+      L_[i] = (L_[i] + ((L_[i - b] + p_[i]) >> 1)) & 255
 
-    return nl # new line after applying filter
+    return L_ # new line after applying filter
 
 ######## PAETH - http://www.w3.org/TR/PNG/#9Filter-type-4-Paeth #########
-  def sf_4(self, L_, p_, w_):
+  def sf_4(self, L_, p_):
     ''' Scanline filter 4 - Paeth '''
 
-    nl = [tuple(map(lambda x, w, y, z: (x+self.paeth(w, y, z))%256,\
-      L_[0], (0, 0, 0), p_[0], (0, 0, 0)))]
-
-    for i in range(1, w_):
-      nl.append(tuple(map(lambda x, w, y,z: (x+self.paeth(w, y, z))%256,\
-        L_[i], nl[i-1], p_[i], p_[i-1])))
-
-    return nl # new line after applying filter
+    b = self.bpp
+    for i in range(0, b): # no pixel to the left => predictor is up
+      L_[i] = (L_[i] + p_[i]) & 255
+    for i in range(b, len(L_)): # self.paeth inlined, it is hot
+      a, u, c = L_[i - b], p_[i], p_[i - b]
+      pa, pb = u - c, a - c
+      pc = abs(pa + pb)
+      pa, pb = abs(pa), abs(pb)
+      if pa <= pb and pa <= pc:
+        L_[i] = (L_[i] + a) & 255
+      elif pb <= pc:
+        L_[i] = (L_[i] + u) & 255
+      else:
+        L_[i] = (L_[i] + c) & 255
+
+    return L_ # new line after applying filter
 
 ########### PNG FILTERS - http://www.w3.org/TR/PNG/#9Filters ############
   scanline_filters =  { # pointers to filter functions
@@ -123,17 +137,86 @@ class PngReader():
                         4 : sf_4 
                       }
 
-  def scanlines(self, d_, w_, h_):
-    ''' Prepare png for scanlines filter application '''
- 
-    ret = list() # png in format [(filter_num, [picture_line]), ...]
-    j = 0 # helper index for moving in old png format (d_)
-    for i in range(0, h_):
-      ret.append((d_[j], [(d_[x+1], d_[x+2], d_[x+3]) \
-        for x in range(j, 3*w_ + j, 3)])) 
-      j += 3 * w_ + 1
+########################## NUMPY PNG FILTERS ############################
+  def nf_1(self, L_, p_):
+    ''' Scanline filter 1 - Sub, cumulative sum of every channel '''
 
-    return ret
+    return numpy.cumsum(L_.reshape(-1, self.bpp), axis=0, \
+      dtype=numpy.uint8).reshape(-1)
+
+  def nf_2(self, L_, p_):
+    ''' Scanline filter 2 - Up '''
+
+    return L_ + p_ # uint8 wraps around by itself
+
+  def nf_loop(self, L_, p_, f_):
+    ''' Filters depending on the previous byte run on bytearrays '''
+
+    return numpy.frombuffer(self.scanline_filters[f_](self, \
+      bytearray(L_.tobytes()), p_.tobytes()), dtype=numpy.uint8)
+
+  numpy_filters = { # pointers to filter functions working on uint8 rows
+                    0 : lambda self, L_, p_: L_,
+                    1 : nf_1,
+                    2 : nf_2,
+                    3 : lambda self, L_, p_: self.nf_loop(L_, p_, 3),
+                    4 : lambda self, L_, p_: self.nf_loop(L_, p_, 4)
+                  }
+
+  def line(self, f_, L_, p_):
+    ''' Unfilter line L_ (bytearray) filtered with f_, previous line p_ '''
+
+    if f_ not in self.scanline_filters:
+      raise PNGNotImplementedError('File is not a valid png')
+    if self.vectorize:
+      return self.numpy_filters[f_](self, \
+        numpy.frombuffer(L_, dtype=numpy.uint8), p_)
+    return self.scanline_filters[f_](self, L_, p_)
+
+  def rows(self):
+    ''' Yield unfiltered lines one by one (uint8 arrays or bytearrays of
+        3 * width bytes), only the previous line is kept in memory '''
+
+    n = self.bpp * self.width # bytes in one line (without the filter type)
+    z = zlib.decompressobj()
+    d = bytearray() # decompressed data not unfiltered yet
+    y = 0 # lines done
+    if self.vectorize:
+      prev = numpy.zeros(n, dtype=numpy.uint8)
+    else:
+      prev = bytes(n)
+
+    for s, e in self.idat: # view of the mapping lives only in the call
+      d += z.decompress(self.data[s:e], max(n + 1, CHUNK)) # bounded output
+      while y < self.height:
+        while len(d) > n and y < self.height:
+          prev = self.line(d[0], d[1:n + 1], prev)
+          del d[:n + 1]
+          y += 1
+          yield prev
+        if not z.unconsumed_tail:
+          break
+        d += z.decompress(z.unconsumed_tail, max(n + 1, CHUNK))
+
+    d += z.flush()
+    while len(d) > n and y < self.height:
+      prev = self.line(d[0], d[1:n + 1], prev)
+      del d[:n + 1]
+      y += 1
+      yield prev
+    if y < self.height:
+      raise PNGNotImplementedError('File is not a valid png')
+
+  @property
+  def rgb(self):
+    ''' Pixels as list of lines, line is a list of (r, g, b) tuples '''
+
+    if self._rgb is None:
+      d = bytes(self.pixels)
+      n = self.bpp * self.width
+      self._rgb = [list(zip(d[j:j + n:3], d[j + 1:j + n:3], \
+        d[j + 2:j + n:3])) for j in range(0, n * self.height, n)]
+    return self._rgb
 
 ############################### CHUNK PARSING ###########################
   def idhr(self, ihdr_):
@@ -163,56 +246,84 @@ class PngReader():
     else:
       return w, h
 
-  def parse_png(self, png_):
-    ''' Parse picture and return it's data + width + height '''
-
-    s = 25 # first byte after IHDR chunk
-    d = list() # list of IDAT chunks
-    w, h = self.idhr(png_[:s]) # width, height of png_
+  def chunks(self, png_, s_):
+    ''' Check chunks of png_ (memoryview) starting at byte s_, return
+        (start, end) of data of every IDAT chunk '''
 
+    d = list() # spans of IDAT chunks
     while 1:
-      l = int.from_bytes(png_[s:s + 4], 'big')
-      s +=4 # start of chunk after reading is's length
-      if png_[s:s + 4] == b'IEND': # crc32 is OK because we can ...
+      if s_ + 8 > len(png_): # missing IEND chunk
+        raise PNGMissingIEND('File is not a png')
+      l = int.from_bytes(png_[s_:s_ + 4], 'big')
+      s_ += 4 # start of chunk after reading is's length
+      if png_[s_:s_ + 4] == b'IEND': # crc32 is OK because we can ...
         break # recognize b'IEND' and there are no data
 
-      c = png_[s + 4:s + 4 + l] # chunk content - data
-      if zlib.crc32(png_[s:s + 4 + l]) != \
-      int.from_bytes(png_[s + 4 + l:s + 8 + l], 'big'): # crc32 check
+      if s_ + 8 + l > len(png_):
+        raise PNGMissingIEND('File is not a png')
+      if zlib.crc32(png_[s_:s_ + 4 + l]) != \
+      int.from_bytes(png_[s_ + 4 + l:s_ + 8 + l], 'big'): # crc32 check
         raise PNGErrorCRC32('File is corrupted')
 
-      if png_[s:s + 4] == b'IDAT':
-        d.append(c) # if chunk contains data => store them
-      s += l + 8
+      if png_[s_:s_ + 4] == b'IDAT':
+        d.append((s_ + 4, s_ + 4 + l)) # if chunk contains data => store it
+      s_ += l + 8
 
-      if l == 0 and d == b'': # missing IEND chunk
-        raise PNGMissingIEND('File is not a png')
-    
     if len(d) == 0:
       raise PNGMissingIDAT('File is not a png')
 
-    return b''.join(d), w, h
+    return d
+
+  def close(self):
+    ''' Unmap the file '''
+
+    if self.map is not None:
+      self.data.release()
+      self.map.close()
+      self.map = None
 
 ####################### CONSTRUCTOR == PARSE PNG ########################
-  def __init__(self, filepath):
-    ''' Parse png into pixels '''
+  def __init__(self, filepath, vectorize=True, stream=False):
+    ''' Parse png into pixels (with numpy if vectorize and available),
+        with stream only check it, lines are then decoded by self.rows '''
+
+    self.vectorize = vectorize and numpy is not None
+    self._rgb = None # list of tuples made on demand from self.pixels
+    self.pixels = None
+    self.map = None
 
     try:
       with open(filepath, 'rb') as f:
-        c = f.read()
+        self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
     except (TypeError, ValueError, IOError, OSError) as e:
       raise IOError(e)
+    self.data = memoryview(self.map)
 
-    if c[:8] != b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A': # PNG header
-      raise PNGWrongHeaderError(str(filepath) + ' is not a png')
-
-    data, width, height = self.parse_png(c[8:])
-    data = self.scanlines(bytearray(zlib.decompress(data)), \
-      width, height)
-
-    self.rgb = [self.scanline_filters[data[0][0]](self, data[0][1],\
-      [(0, 0, 0) for x in range(0, width)], width)]
-
-    for i in range(1, height):
-      self.rgb.append(self.scanline_filters[data[i][0]](self, \
-        data[i][1], self.rgb[i-1], width))
\ No newline at end of file
+    try:
+      if self.data[:8] != b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A': # PNG header
+        raise PNGWrongHeaderError(str(filepath) + ' is not a png')
+      self.width, self.height = self.idhr(self.data[8:33].tobytes())
+      self.idat = self.chunks(self.data, 33)
+      if not stream:
+        self.pixels = self.decode()
+    except BaseException:
+      self.close()
+      raise
+    if not stream:
+      self.close()
+
+  def decode(self):
+    ''' Return all lines as uint8 array of shape (height, width, 3) or
+        flat bytearray without numpy '''
+
+    n = self.bpp * self.width
+    if self.vectorize:
+      ret = numpy.empty((self.height, n), dtype=numpy.uint8)
+      for y, L in enumerate(self.rows()):
+        ret[y] = L
+      return ret.reshape(self.height, self.width, self.bpp)
+
+    ret = bytearray()
+    for L in self.rows():
+      ret += L
+    return ret
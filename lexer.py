@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Streaming lexer for BrainFuck sources
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Source files are read in binary (memory mapped when possible) and
+  cleaned chunk by chunk with bytes.translate, so comments may be in any
+  encoding and the cleaned source never exists as a whole. Everything
+  after the first ! is the input of the program, it is copied out of the
+  file (usually short) so the map can be closed once lexing ends.
+'''
+
+# IMPORTS
+import std, os, mmap
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+INSTRUCTIONS = b'><+-.,[]'
+DELETE = bytes(c for c in range(0, 256) if c not in INSTRUCTIONS + b'!')
+CHUNK = 1 << 20 # bytes cleaned at once
+
+################################# LEXER #################################
+class Lexer():
+  ''' Iterable of cleaned code chunks, .stdin is set once it is exhausted '''
+
+  def __init__(self, source_, chunk_=CHUNK):
+    ''' Lex file source_ (if it exists) or source_ itself '''
+
+    self.chunk = chunk_
+    self.stdin = None # input after ! (str or bytes)
+    self.map = None # mapped source file
+
+    if os.path.isfile(source_):
+      with open(source_, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+          self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+          self.data = memoryview(self.map)
+        else:
+          self.data = memoryview(b'')
+    else: # source code itself, keep the input as it is
+      if '!' in source_:
+        self.stdin = source_[source_.find('!') + 1:]
+        source_ = source_[:source_.find('!')]
+      self.data = memoryview(source_.encode('utf-8', 'surrogateescape'))
+
+  def __iter__(self):
+    ''' Yield code chunks without comments, stop at ! '''
+
+    try:
+      for i in range(0, len(self.data), self.chunk):
+        r = self.data[i:i + self.chunk].tobytes() # raw ...
+        c = r.translate(None, DELETE) # ... and cleaned chunk
+        if b'!' in c: # the rest is input
+          self.stdin = self.data[i + r.find(b'!') + 1:].tobytes()
+          yield c[:c.find(b'!')]
+          return
+        yield c
+    finally:
+      self.close()
+
+  def close(self):
+    ''' Unmap the source file (lexing ends) '''
+
+    self.data.release()
+    if self.map is not None:
+      self.map.close()
+      self.map = None
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "LEXER can only be imported, not run!")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Lockstep execution of one BrainFuck program over many inputs (NumPy)
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Every input is a lane: the tapes of all lanes are rows of a uint8 matrix,
+  pointers, ends of the tapes, instruction pointers and instructions
+  executed are vectors. Every step executes the instruction at the lowest
+  instruction pointer of the running lanes for all lanes standing there
+  (a mask of active lanes), so lanes that took a different branch at [ or
+  ] wait until the others get there again. Lanes that halt or fail
+  (limits, pointer left of cell 0) retire one by one; a scan stuck at
+  cell 0 fails like a single run hitting its limits would (or with an
+  error instead of running forever). Outputs, memory and instructions
+  executed are exactly those of single runs of the array engine on a
+  flat tape.
+'''
+
+# IMPORTS
+import std, sys, json, time, bytecode, tape, reader, image_png
+from bytecode import ADD, MOVE, OUT, IN, JZ, JNZ, SET, MUL, SCAN, ADDO, \
+                     LEFT_EDGE
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+LANES = 1024 # inputs run at once
+WIDTH = 4096 # cells of every tape at start (the matrix grows as needed)
+TICK = 1024 # steps between checks of the deadline
+STUCK = 'memory pointer stuck at cell 0, the run would never end'
+
+############################### EXECUTION ###############################
+def available():
+  ''' Can runs be vectorized (is NumPy installed)? '''
+
+  return image_png.numpy is not None
+
+def execute(code_, inputs_, eof_='keep', limit_=None, deadline_=None, \
+            cap_=None, cells_=b'\x00', pointer_=0):
+  ''' Run Bytecode code_ once for every input (bytes) of inputs_ on tapes
+      holding cells_ (pointer_ into them), at most limit_ instructions and
+      cap_ cells each, until time.monotonic() deadline_; return list of
+      (output, cells, pointer, instructions executed, error) of the runs,
+      error is None or the exception a single run would raise '''
+
+  np = image_png.numpy
+  ops, args, offs = code_.ops.tolist(), code_.args.tolist(), \
+                    code_.offs.tolist()
+  clamp = code_.clamp
+  eof = reader.EOF_POLICIES[eof_]
+  limit = sys.maxsize if limit_ is None else limit_
+  cap = sys.maxsize if cap_ is None else cap_
+  k = len(inputs_)
+
+  w = max(len(cells_), 1)
+  T = np.zeros((k, max(WIDTH, w)), np.uint8) # tapes
+  T[:, :len(cells_)] = np.frombuffer(bytes(cells_), np.uint8)
+  P = np.full(k, pointer_, np.int64) # pointers
+  L = np.full(k, w, np.int64) # ends of the tapes ...
+  C = np.full(k, w, np.int64) # ... and cells they would have reserved
+  N = np.zeros(k, np.int64) # instructions executed
+  IP = np.zeros(k, np.int64) # instruction pointers
+  size = np.array([len(i) for i in inputs_], np.int64) # input ...
+  start = np.concatenate(([0], np.cumsum(size)[:-1])).astype(np.int64)
+  pos = np.zeros(k, np.int64) # ... cursor into it
+  data = np.frombuffer(b''.join(inputs_) + b'\x00', np.uint8)
+  log = list() # (lanes, values) written by .
+  err = [None] * k
+  act = np.arange(k) # lanes still running
+
+  def grow(n_):
+    ''' Make every tape hold at least n_ cells '''
+
+    nonlocal T
+    if n_ > T.shape[1]:
+      U = np.zeros((k, max(n_, 2 * T.shape[1])), np.uint8)
+      U[:, :T.shape[1]] = T
+      T = U
+
+  def retire(lanes_, e_):
+    ''' Stop running lanes_ (lane numbers) with error e_(lane) '''
+
+    nonlocal act
+    for j in lanes_.tolist():
+      err[j] = e_(j)
+    act = act[~np.isin(act, lanes_)]
+
+  def end(lanes_):
+    ''' Retire lanes_ whose tapes got longer than cap, make the tapes of
+        the others that long, return lanes_ still running '''
+
+    more = lanes_[(L[lanes_] > C[lanes_]) & (L[lanes_] <= cap)] # reserve
+    C[more] = np.minimum(np.maximum(L[more], 2 * C[more]), cap)
+    bad = L[lanes_] > cap
+    if bad.any():
+      retire(lanes_[bad], lambda j: tape.TapeLimitError( \
+        'tape limit of {0} cells exceeded'.format(cap)))
+      lanes_ = lanes_[~bad]
+    if len(lanes_):
+      grow(int(L[lanes_].max()))
+    return lanes_
+
+  def cell(idx_, off_):
+    ''' Return (lanes, indexes) of cells at off_ of lanes idx_, growing
+        tapes and retiring lanes that fail like the interpreter would '''
+
+    q = P[idx_] + off_
+    over = q >= L[idx_]
+    if over.any():
+      L[idx_[over]] = q[over] + 1
+      ok = np.isin(idx_, end(idx_[over])) | ~over
+      idx_, q = idx_[ok], q[ok]
+    if off_ < 0 and (q < 0).any():
+      retire(idx_[q < 0], lambda j: IndexError(LEFT_EDGE))
+      idx_, q = idx_[q >= 0], q[q >= 0]
+    return idx_, q
+
+  def limits(idx_):
+    ''' Retire lanes of idx_ that executed more than limit instructions '''
+
+    bad = N[idx_] > limit
+    if bad.any():
+      retire(idx_[bad], lambda j: bytecode.LimitError('steps', int(N[j]), \
+                                                      limit))
+
+  steps = 0
+  while len(act):
+    steps += 1
+    if deadline_ is not None and not steps % TICK and \
+       time.monotonic() > deadline_:
+      retire(act, lambda j: bytecode.LimitError('time', int(N[j]), \
+                                                deadline_))
+      break
+    ips = IP[act]
+    ip = int(ips.min())
+    sel = ips == ip
+    idx = act if sel.all() else act[sel]
+    op, a = ops[ip], args[ip]
+    if op:
+      N[idx] += 1
+    if op == ADD:
+      T[idx, P[idx]] += np.uint8(a & 255)
+      IP[idx] += 1
+    elif op == MOVE:
+      IP[idx] += 1
+      P[idx] += a
+      if a > 0:
+        g = P[idx] >= L[idx]
+        if g.any():
+          L[idx[g]] += a
+          end(idx[g])
+      else:
+        neg = idx[P[idx] < 0]
+        if len(neg) and clamp:
+          P[neg] = 0
+        elif len(neg): # undo the move like a single run does
+          P[neg] -= a
+          retire(neg, lambda j: IndexError(LEFT_EDGE))
+    elif op == JZ or op == JNZ:
+      z = T[idx, P[idx]] == 0
+      IP[idx] = np.where(z if op == JZ else ~z, a, ip + 1)
+      limits(idx)
+    elif op in (ADDO, SET, OUT, IN):
+      IP[idx] += 1
+      idx, q = cell(idx, offs[ip])
+      if op == ADDO:
+        T[idx, q] += np.uint8(a & 255)
+      elif op == SET:
+        T[idx, q] = a
+      elif op == OUT:
+        log.append((np.repeat(idx, a), np.repeat(T[idx, q], a)))
+      else: # IN, like reader.Reader.read
+        left = size[idx] - pos[idx]
+        full = left >= a
+        v = data[np.where(full, start[idx] + pos[idx] + a - 1, \
+                          start[idx] + size[idx] - 1)]
+        if eof is not None:
+          v = np.where(full, v, eof)
+        else:
+          v = np.where(full | (left > 0), v, T[idx, q])
+        T[idx, q] = v
+        pos[idx] = np.minimum(pos[idx] + a, size[idx])
+    elif op == MUL:
+      IP[idx] += 1
+      idx = idx[T[idx, P[idx]] != 0]
+      if len(idx):
+        idx, q = cell(idx, offs[ip])
+        T[idx, q] = (T[idx, q] + T[idx, P[idx]].astype(np.int64) * a) & 255
+    elif op == SCAN:
+      IP[idx] += 1
+      for j in idx.tolist():
+        p, l, row = int(P[j]), int(L[j]), T[j]
+        z = np.flatnonzero(row[p:l:a] == 0) if a > 0 else \
+            np.flatnonzero(row[p::a] == 0)
+        if len(z):
+          P[j] = p + int(z[0]) * a
+        elif a > 0: # ran off the end, grow like > would
+          P[j] = p + ((l - p + a - 1) // a) * a
+          L[j] = l + a
+          end(np.array([j]))
+        elif clamp and not row[0]: # rerun from cell 0 (counted)
+          P[j] = 0
+          N[j] += 1
+        elif clamp and limit_ is not None: # reruns count up to the limit
+          P[j] = 0
+          N[j] = max(N[j], limit + 1)
+          retire(np.array([j]), lambda j: bytecode.LimitError('steps', \
+                                                int(N[j]), limit))
+        elif clamp and deadline_ is not None: # reruns until the deadline
+          P[j] = 0
+          retire(np.array([j]), lambda j: bytecode.LimitError('time', \
+                                                int(N[j]), deadline_))
+        else:
+          retire(np.array([j]), lambda j: IndexError(STUCK if clamp else \
+                                                     LEFT_EDGE))
+    else: # HALT
+      limits(idx)
+      act = act[~np.isin(act, idx)]
+
+  out = [b''] * k
+  if log:
+    lanes = np.concatenate([l for l, v in log])
+    vals = np.concatenate([v for l, v in log])
+    order = np.argsort(lanes, kind='stable')
+    data = vals[order].tobytes()
+    ends = np.cumsum(np.bincount(lanes, minlength=k)).tolist()
+    out = [data[b:e] for b, e in zip([0] + ends[:-1], ends)]
+
+  ret = list()
+  for j in range(0, k):
+    e = err[j]
+    n = int(N[j]) if e is None or isinstance(e, bytecode.LimitError) \
+      else None
+    l = min(int(L[j]), int(C[j]))
+    ret.append((out[j].decode('latin-1'), bytes(T[j, :l]), int(P[j]), n, e))
+  return ret
+
+################################ RUNNING ################################
+def main(a_):
+  ''' Run program of parsed arguments a_ once for every line (with its
+      newline) of file a_['inputs'], print a JSON line of results for each
+      to stdout (in the order of the lines): index of the line, error
+      (name from std.EXIT_CODES, null on success), exit code, message,
+      output, instructions executed; return number of failed runs '''
+
+  import brainx, cache # brainx imports this module
+  c = None
+  try:
+    if a_['cache'] and not a_['no_cache']:
+      c = cache.Cache(a_['cache'], a_['cache_limit'], a_['rebuild_cache'])
+    p = brainx.compile(a_['source'], a_['type'], 'array', a_['optimize'], \
+                       c, a_['prefix'])
+    with open(a_['inputs'], 'rb') as f:
+      inputs = f.readlines()
+  except brainx.BrainError as e:
+    std.exit_failure(e.code, std.create_error_msg("PYTHON", e))
+  except (ValueError, OSError) as e:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", e))
+  finally:
+    if c is not None:
+      c.close()
+
+  failed = 0
+  for i, r in enumerate(p.run_many(inputs, a_['max_steps'], a_['timeout'], \
+                                   a_['max_tape'], a_['eof'], a_['lanes'])):
+    res = { 'index': i, 'error': None, 'exit': 0, 'message': None }
+    if isinstance(r, brainx.BrainError):
+      res.update(error=r.code, exit=std.EXIT_CODES[r.code], message=str(r))
+      r = r.result
+      failed += 1
+    res.update(output=r.output, steps=r.steps)
+    print(json.dumps(res, sort_keys=True), flush=True)
+  return failed
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "LOCKSTEP can only be imported, not run!")
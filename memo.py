@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Memoization of pure balanced loops of BrainFuck bytecode
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  A loop is pure and balanced when its body does no I/O, has no SCAN and
+  moves the pointer back where it started (so do its inner loops): all it
+  does is a function of a small window of cells around the pointer. Such
+  loops are found in the bytecode before a run, their JZ becomes MEMO and
+  the run keeps an LRU cache (window on entry -> window on exit and
+  instructions executed). A hit replaces the whole loop by writing the
+  window, a miss runs the loop in the interpreter (its inner loops are
+  memoized too) and remembers its result.
+  Instructions executed (and the end of the tape) are exactly those of the
+  interpreter; a hit that would skip a check of limits runs the loop.
+'''
+
+# IMPORTS
+import std, threading, bytecode, tape
+from array import array
+from collections import OrderedDict
+from bytecode import Bytecode, HALT, ADD, MOVE, JZ, JNZ, SET, MUL, ADDO, \
+                     MEMO
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+WINDOW = 16 # cells a memoized loop may touch
+ENTRIES = 4096 # windows remembered (all loops together)
+TOP = 20 # loops listed in the report
+
+################################ LOOPS ##################################
+def window(code_, jz_):
+  ''' Return (lowest, highest) offset of cells the loop starting at jz_
+      touches, None if it is not pure and balanced '''
+
+  lo = hi = pos = 0
+  stack = list() # positions at [ of inner loops
+  for i in range(jz_ + 1, code_.args[jz_] - 1):
+    op = code_.ops[i]
+    if op == MOVE:
+      pos += code_.args[i]
+    elif op == JZ:
+      stack.append(pos)
+    elif op == JNZ:
+      if stack.pop() != pos:
+        return None
+    elif op in (SET, MUL, ADDO):
+      lo = min(lo, pos + code_.offs[i])
+      hi = max(hi, pos + code_.offs[i])
+    elif op != ADD: # I/O, SCAN, HALT
+      return None
+    lo, hi = min(lo, pos), max(hi, pos)
+  return (lo, hi) if pos == 0 else None
+
+def find(code_, window_=WINDOW):
+  ''' Return [(JZ, index behind JNZ, lowest, highest offset)] of the pure
+      balanced loops of Bytecode code_ touching at most window_ cells '''
+
+  ret = list()
+  for i in range(0, len(code_)):
+    if code_.ops[i] == JZ:
+      w = window(code_, i)
+      if w is not None and w[1] - w[0] < window_:
+        ret.append((i, code_.args[i]) + w)
+  return ret
+
+def loop(code_, jz_):
+  ''' Return Bytecode of just the loop of code_ starting at jz_ '''
+
+  end = code_.args[jz_]
+  ret = Bytecode()
+  ret.ops = code_.ops[jz_:end]
+  ret.args = array('i', [a - jz_ if op in (JZ, JNZ, MEMO) else a for op, a \
+                         in zip(code_.ops[jz_:end], code_.args[jz_:end])])
+  ret.offs = code_.offs[jz_:end]
+  ret.src = code_.src[jz_:end]
+  ret.emit(HALT, 0, code_.src[end - 1])
+  ret.clamp = code_.clamp
+  ret.memo = dict((j - jz_, i) for j, i in code_.memo.items() \
+                  if jz_ < j < end)
+  return ret
+
+################################# MEMO ##################################
+class Memo():
+  ''' Pure balanced loops of a program, windows they were entered with
+      (LRU) and statistics of their runs '''
+
+  def __init__(self, window_=WINDOW, entries_=ENTRIES):
+    if window_ < 1 or entries_ < 1:
+      raise ValueError("memo window and entries must be positive")
+    self.window = window_
+    self.entries = entries_
+    self.found = dict() # Bytecode -> its copy with MEMO
+    self.loops = list() # (lowest, highest offset, Bytecode, statistics)
+    self.cache = OrderedDict() # (loop, window, end of tape) ->
+                               # (window, instructions, end of tape)
+    self.stats = dict() # (source offsets of [ and ]) -> [hits, misses]
+    self.evicted = 0
+    self.runs = 0
+    self.lock = threading.Lock() # runs in many threads share all this
+
+  def prepare(self, code_):
+    ''' Return copy of Bytecode code_ with MEMO at its memoized loops '''
+
+    with self.lock:
+      if code_ not in self.found:
+        ret = Bytecode()
+        ret.ops = array('i', code_.ops)
+        ret.args = code_.args
+        ret.offs = code_.offs
+        ret.src = code_.src
+        ret.clamp = code_.clamp
+        ret.memo = dict() # JZ -> index into .loops
+        found = find(code_, self.window)
+        for jz, end, lo, hi in found:
+          ret.ops[jz] = MEMO
+          ret.memo[jz] = len(self.loops) + len(ret.memo)
+        for jz, end, lo, hi in found:
+          s = self.stats.setdefault((code_.src[jz], code_.src[end - 1]), \
+                                    [0, 0])
+          self.loops.append((lo, hi, loop(ret, jz), s))
+        self.found[code_] = ret
+      return self.found[code_]
+
+  def report(self, top_=TOP):
+    ''' Return human readable statistics, top_ most entered loops '''
+
+    hits = sum(s[0] for s in self.stats.values())
+    total = hits + sum(s[1] for s in self.stats.values())
+    ret = ['memo: window {0}, {1} loops, {2}/{3} windows cached, {4} '
+           'evicted, {5} runs'.format(self.window, len(self.stats), \
+           len(self.cache), self.entries, self.evicted, self.runs),
+           'hits {0} of {1} ({2:.1%})'.format(hits, total, \
+           hits / total if total else 0),
+           'memoized loops (by entries, source offsets of [ and ]):']
+    loops = sorted(self.stats.items(), key=lambda l: (-sum(l[1]), l[0]))
+    for (b, e), (h, m) in loops[:top_]:
+      ret.append('  [{0:>7} ]{1:>7} {2:>12} hits {3:>12} misses'.format(b, \
+                 e, h, m))
+    if len(loops) > top_:
+      ret.append('  ... {0} more'.format(len(loops) - top_))
+    return '\n'.join(ret)
+
+############################### EXECUTION ###############################
+def execute(code_, tape_, out_, in_, check_=None, memo_=None):
+  ''' Run Bytecode code_ on tape.Tape tape_, pure balanced loops memoized
+      in Memo memo_; return number of instructions executed, limits are
+      checked by check_ (see bytecode.budget) '''
+
+  memo = memo_ if memo_ is not None else Memo()
+  check = check_ if check_ is not None else bytecode.budget()
+  run = memo.prepare(code_)
+  m = tape_.cells
+  if isinstance(m, tape.Pages): # no slices
+    get = lambda a_, b_: bytes(m[q] for q in range(a_, b_))
+    def put(a_, w_):
+      for q, v in enumerate(w_, a_):
+        m[q] = v
+  else:
+    get = lambda a_, b_: bytes(m[a_:b_])
+    def put(a_, w_):
+      m[a_:a_ + len(w_)] = w_
+
+  def enter(i_, n_, due_):
+    ''' Execute body of loop i_ entered (its JZ executed) with n_
+        instructions executed, limits due at due_; return instructions
+        executed '''
+
+    lo, hi, sub, stats = memo.loops[i_]
+    p = tape_.p
+    a, b = p + lo, p + hi + 1
+    key = None
+    if a >= 0 and b <= tape_.cap: # cells past the end are zero
+      tape_.reserve(b)
+      key = (i_, get(a, b), min(tape_.L - p, b - p)) # the end may grow
+      with memo.lock:
+        hit = memo.cache.get(key)
+        if hit is not None and n_ + hit[1] <= due_ and \
+           p + hit[2] <= tape_.cap:
+          memo.cache.move_to_end(key)
+          stats[0] += 1
+        else:
+          hit = None
+      if hit is not None:
+        put(a, hit[0])
+        tape_.L = max(tape_.L, p + hit[2])
+        return n_ + hit[1]
+    n = bytecode.execute(sub, tape_, out_, in_, check, 1, n_, enter)
+    if key is not None:
+      with memo.lock:
+        memo.cache[key] = (get(a, b), n - n_, tape_.L - p)
+        stats[1] += 1
+        if len(memo.cache) > memo.entries:
+          memo.cache.popitem(last=False)
+          memo.evicted += 1
+    return n
+
+  with memo.lock:
+    memo.runs += 1
+  return bytecode.execute(run, tape_, out_, in_, check, 0, 0, enter)
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "MEMO can only be imported, not run!")
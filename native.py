@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  BrainFuck bytecode to C translator, built by the system compiler and
+  run through ctypes (native engine)
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+'''
+
+# IMPORTS
+import std, os, os.path, shutil, subprocess, hashlib, tempfile, ctypes
+from bytecode import HALT, ADD, ADDO, MOVE, OUT, IN, JZ, JNZ, SET, MUL, \
+                     SCAN, LEFT_EDGE, budget
+from tape import TapeLimitError
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+E_OK, E_LEFT, E_NOMEM, E_IO, E_LIMIT, E_TAPE = 0, 1, 2, 3, 4, 5 # bf_run
+MAX_DEPTH = 64 # nested loops per C function
+MAX_LINES = 2000 # C compilers get very slow on huge functions, split them
+
+######################### E - NO NATIVE BACKEND #########################
+class NativeError(Exception):
+  ''' EXCEPTION: program cannot be compiled to native code '''
+  pass
+
+############################### C RUNTIME ###############################
+RUNTIME = r'''
+#include <stdlib.h>
+#include <string.h>
+
+typedef int (*put_t)(int, long);
+typedef int (*get_t)(long);
+typedef long (*tick_t)(long);
+typedef struct { unsigned char *m; long L; long cap; long p;
+                 long n; long due; long max; tick_t tick; } bf_state;
+
+static unsigned char *fit(unsigned char *m, long *cap, long n, long max)
+{
+  long c = *cap * 2 > n ? *cap * 2 : n;
+  unsigned char *r;
+  if (c > max) c = max;
+  r = realloc(m, c);
+  if (r) { memset(r + *cap, 0, c - *cap); *cap = c; }
+  return r;
+}
+
+int bf_load(bf_state *s, const unsigned char *d, long n, long p)
+{
+  s->cap = n > 4096 ? n : 4096;
+  if (s->cap > s->max && s->max >= n) s->cap = s->max;
+  s->m = calloc(s->cap, 1);
+  if (!s->m) return 0;
+  memcpy(s->m, d, n);
+  s->L = n;
+  s->p = p;
+  return 1;
+}
+
+void bf_free(bf_state *s)
+{
+  free(s->m);
+  s->m = NULL;
+}
+
+#define NEED(n) if ((n) > cap) { if ((n) > s->max) FAIL(5); \
+                                if (!(t = fit(m, &cap, (n), s->max))) \
+                                  FAIL(2); \
+                                m = t; }
+#define CELL(q) if ((q) < 0) FAIL(1); \
+                if ((q) >= L) { NEED((q) + 1); L = (q) + 1; }
+#define LOAD m = s->m; L = s->L; cap = s->cap; p = s->p; n = s->n; \
+             due = s->due
+#define SAVE s->m = m; s->L = L; s->cap = cap; s->p = p; s->n = n; \
+             s->due = due
+#define FAIL(e) { SAVE; return e; }
+#define CALL(f) SAVE; if ((r = f(s, put, get))) return r; LOAD
+#define TICK(c) n += c; if (n > due) { SAVE; due = s->tick(n); \
+                                       if (due < 0) return 4; }
+#define VARS unsigned char *m, *t, *z; long L, cap, p, q, n, due; int r; \
+             LOAD
+'''
+
+############################ PROGRAM WRAPPER ############################
+class NativeProgram():
+  ''' Bytecode compiled to a shared object '''
+
+  def __init__(self, code_, source_, top_=None):
+    ''' Build (or find already built) shared object from C source_, top_
+        is the number of instructions outside loops if it counts the
+        others '''
+
+    self.source = source_ # generated C source
+    self.top = top_
+    self.stdin = code_.stdin
+    self.clamp = code_.clamp
+    self.rewrites = code_.rewrites
+    self.path = build(source_)
+    self.lib = ctypes.CDLL(self.path)
+    self.lib.bf_run.argtypes = [ctypes.POINTER(State), PUT, GET]
+    self.lib.bf_load.argtypes = [ctypes.POINTER(State), ctypes.c_char_p, \
+                                 ctypes.c_long, ctypes.c_long]
+
+  def __len__(self):
+    return len(self.source)
+
+PUT = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_int, ctypes.c_long)
+GET = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_long)
+TICK = ctypes.CFUNCTYPE(ctypes.c_long, ctypes.c_long)
+
+class State(ctypes.Structure):
+  ''' bf_state from the C runtime '''
+
+  _fields_ = [('m', ctypes.c_void_p), ('L', ctypes.c_long), \
+              ('cap', ctypes.c_long), ('p', ctypes.c_long), \
+              ('n', ctypes.c_long), ('due', ctypes.c_long), \
+              ('max', ctypes.c_long), ('tick', TICK)]
+
+############################### GENERATOR ###############################
+def translate(code_, limits_=False):
+  ''' Translate Bytecode into C source, with limits_ count instructions
+      executed and check limits once per loop iteration '''
+
+  funcs = list() # finished functions
+  stack = list() # [name, lines, depth] of functions being generated
+  ops, args, offs = code_.ops, code_.args, code_.offs
+  counts = [0] # instructions of every open loop (its iteration) and top
+
+  def head(name_):
+    ''' Start a function '''
+
+    return [name_, ['int {0}(bf_state *s, put_t put, get_t get)'.\
+      format(name_), '{', '  VARS;'], 1]
+
+  fn = head('bf_run')
+  for i in range(0, len(code_)):
+    op, a, o = ops[i], args[i], offs[i]
+    c = fn[1]
+    ind = '  ' * fn[2]
+    q = 'p + {0}'.format(o) if o else 'p'
+    if op != HALT: # a loop iteration runs its body and the jump back
+      counts[-1] += 1
+
+    if op == ADD:
+      c.append(ind + 'm[p] += {0};'.format(a & 255))
+    elif op == ADDO:
+      c.append(ind + 'q = {0}; CELL(q); m[q] += {1};'.format(q, a & 255))
+    elif op == MOVE and a > 0:
+      c.append(ind + 'p += {0}; if (p >= L) {{ L += {0}; NEED(L); }}'.\
+        format(a))
+    elif op == MOVE and code_.clamp:
+      c.append(ind + 'p -= {0}; if (p < 0) p = 0;'.format(-a))
+    elif op == MOVE: # the failed move is undone
+      c.append(ind + 'p -= {0}; if (p < 0) {{ p += {0}; FAIL(1); }}'.\
+        format(-a))
+    elif op == SET:
+      c.append(ind + 'q = {0}; CELL(q); m[q] = {1};'.format(q, a & 255))
+    elif op == MUL:
+      c.append(ind + 'if (m[p]) {{ q = {0}; CELL(q); m[q] += m[p] * {1}; }}'.\
+        format(q, a & 255))
+    elif op == SCAN and a == 1:
+      c.append(ind + 'z = memchr(m + p, 0, L - p); if (z) p = z - m; ' + \
+               'else { p = L; L += 1; NEED(L); }')
+    elif op == SCAN and a > 0:
+      c.append(ind + 'while (m[p]) {{ p += {0}; if (p >= L) {{ L += {0}; '
+               'NEED(L); }} }}'.format(a))
+    elif op == SCAN and limits_ and code_.clamp: # count reruns at cell 0
+      c.append(ind + 'while (m[p]) {{ p -= {0}; if (p < 0) {{ p = 0; '
+               'TICK(1); }} }}'.format(-a))
+    elif op == SCAN and code_.clamp:
+      c.append(ind + 'while (m[p]) {{ p -= {0}; if (p < 0) p = 0; }}'.\
+        format(-a))
+    elif op == SCAN: # a failed scan stays where it started
+      c.append(ind + 'q = p; while (m[p]) {{ p -= {0}; if (p < 0) '
+               '{{ p = q; FAIL(1); }} }}'.format(-a))
+    elif op == OUT:
+      c.append(ind + 'q = {0}; CELL(q); if (put(m[q], {1})) FAIL(3);'.\
+        format(q, a))
+    elif op == IN:
+      c.append(ind + 'q = {0}; CELL(q); r = get({1}); if (r == -2) FAIL(3); '
+               'if (r >= 0) m[q] = r;'.format(q, a))
+    elif op == JZ:
+      if fn[2] >= MAX_DEPTH or len(c) > MAX_LINES: # new function
+        name = 'bf_{0}'.format(i)
+        c.append(ind + 'CALL({0});'.format(name))
+        stack.append(fn)
+        fn = head(name)
+        fn[1].append('  while (m[p]) {')
+      else:
+        c.append(ind + 'while (m[p]) {')
+      fn[2] += 1
+      counts.append(0)
+    elif op == JNZ:
+      n = counts.pop()
+      if limits_: # count the iteration, check limits now and then
+        fn[1].append(ind + 'TICK({0});'.format(n))
+      fn[2] -= 1
+      fn[1].append('  ' * fn[2] + '}')
+      if fn[2] == 1 and stack: # end of a helper function
+        fn[1].extend(['  SAVE;', '  return 0;', '}'])
+        funcs.append(fn)
+        fn = stack.pop()
+    else:
+      break
+
+    if fn[2] == 1 and len(fn[1]) > MAX_LINES: # long straight code at top
+      name = 'bf_{0}'.format(i + 1)
+      fn[1].extend(['  CALL({0});'.format(name), '  return 0;', '}'])
+      funcs.append(fn)
+      fn = head(name)
+
+  fn[1].extend(['  SAVE;', '  return 0;', '}'])
+  funcs.append(fn)
+
+  return NativeProgram(code_, RUNTIME + \
+    ''.join('int {0}(bf_state *, put_t, get_t);\n'.format(f[0]) \
+      for f in funcs) + '\n' + '\n\n'.join('\n'.join(f[1]) for f in funcs),\
+    counts[0] if limits_ else None)
+
+################################# BUILD #################################
+def settings():
+  ''' Return C compiler ($CC), its optimization flags ($BF_CFLAGS) and
+      directory of built objects; read from the environment every time,
+      workers of a daemon run with the environment of their client '''
+
+  return os.environ.get('CC', 'cc'), \
+    os.environ.get('BF_CFLAGS', '-O1').split(), \
+    os.path.join(os.environ.get('XDG_CACHE_HOME', \
+      os.path.join(os.path.expanduser('~'), '.cache')), 'brainfuck', 'native')
+
+def available():
+  ''' Is there a C compiler we can use? '''
+
+  return shutil.which(settings()[0]) is not None
+
+def build(source_):
+  ''' Compile C source_ into shared object (cached), return its path '''
+
+  cc, flags, build_dir = settings()
+  if shutil.which(cc) is None:
+    raise NativeError('C compiler ' + cc + ' not found')
+
+  key = hashlib.sha256((' '.join([cc] + flags) + '\n' + source_).\
+    encode('ascii')).hexdigest()
+  so = os.path.join(build_dir, key + '.so')
+  if os.path.isfile(so):
+    return so
+
+  os.makedirs(build_dir, exist_ok=True)
+  with tempfile.TemporaryDirectory(dir=build_dir) as d:
+    c = os.path.join(d, 'bf.c')
+    with open(c, 'w') as f:
+      f.write(source_)
+    r = subprocess.run([cc] + flags + ['-shared', '-fPIC', '-o', \
+      os.path.join(d, 'bf.so'), c], stdout=subprocess.PIPE, \
+      stderr=subprocess.STDOUT)
+    if r.returncode != 0:
+      raise NativeError(r.stdout.decode(errors='replace').strip())
+    os.replace(os.path.join(d, 'bf.so'), so) # atomic, safe for parallel runs
+
+  return so
+
+############################### EXECUTION ###############################
+def execute(prog_, tape_, out_, in_, check_=None):
+  ''' Run NativeProgram on (flat) tape.Tape tape_, return number of
+      instructions executed (None if prog_ does not count them); limits
+      are checked by check_ (see bytecode.budget) if prog_ was translated
+      with limits '''
+
+  error = list() # exception raised inside a callback
+  check = check_ if check_ is not None else budget()
+  write = out_.write
+  read = in_.read
+
+  def put(c_, n_):
+    ''' Execute . instruction(s) '''
+
+    try:
+      write(chr(c_) * n_)
+    except Exception as e:
+      error.append(e)
+      return 1
+    return 0
+
+  def get(n_):
+    ''' Execute , instruction(s), return cell value or -1 (unchanged) '''
+
+    try:
+      return read(n_, -1)
+    except Exception as e:
+      error.append(e)
+      return -2
+
+  def tick(n_):
+    ''' Check limits at n_ instructions, return when to check next '''
+
+    try:
+      return check(n_)
+    except Exception as e:
+      error.append(e)
+      return -1
+
+  s = State() # the C code has a tape of its own, copy ours in and out
+  s.max = tape_.cap
+  s.tick = TICK(tick)
+  s.due = check(0)
+  if not prog_.lib.bf_load(ctypes.byref(s), bytes(tape_.cells[0:tape_.L]), \
+                           tape_.L, tape_.p):
+    raise MemoryError('cannot allocate memory')
+  try:
+    r = prog_.lib.bf_run(ctypes.byref(s), PUT(put), GET(get))
+    # after a tape limit error L may be over the cells allocated
+    tape_.load(ctypes.string_at(s.m, min(s.L, s.cap)), s.p)
+  finally:
+    prog_.lib.bf_free(ctypes.byref(s))
+
+  if r == E_LEFT:
+    raise IndexError(LEFT_EDGE)
+  if r == E_NOMEM:
+    raise MemoryError('cannot allocate memory')
+  if r in (E_IO, E_LIMIT):
+    raise error[0]
+  if r == E_TAPE:
+    raise TapeLimitError('tape limit of {0} cells exceeded'.format( \
+      tape_.cap))
+  if prog_.top is None:
+    return None
+  if s.n + prog_.top > s.due: # instructions outside loops are added now
+    check(s.n + prog_.top)
+  return s.n + prog_.top
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "NATIVE can only be imported, not run!")
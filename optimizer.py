@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Peephole optimizer for BrainFuck bytecode
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Levels:
+    0 - no rewrites, just runs of identical instructions collapsed
+    1 - clear loops [-] => SET 0, scan loops [>] / [<<] => SCAN
+        (execution stays exactly the same as with the dict engine)
+    2 - level 1 + pointer moves folded into offset addressed ops and
+        multiply loops [->+>++<<] => MUL; moving the pointer left of
+        cell 0 is an error instead of being clamped and memory may end
+        up with a different number of trailing zero cells
+'''
+
+# IMPORTS
+import std
+from bytecode import Bytecode, HALT, ADD, ADDO, MOVE, JZ, JNZ, SET, MUL, \
+                     SCAN
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+VERSION = 2 # bump when the produced bytecode changes (cache keys)
+LEVELS = (0, 1, 2) # supported optimization levels
+REWRITES = ('clear', 'scan', 'mul', 'fold') # names used in reports
+
+############################ TREE -> BYTECODE ###########################
+def emit(tree_, code_):
+  ''' Append instructions in tree_ into Bytecode code_ '''
+
+  stack = [(iter(tree_), None)] # bodies being emitted, (JZ index, src)
+
+  while stack:
+    t = next(stack[-1][0], None)
+    if t is None: # end of body
+      loop = stack.pop()[1]
+      if loop is not None:
+        end = code_.emit(JNZ, loop[0] + 1, loop[1])
+        code_.args[loop[0]] = end + 1
+    elif t[0] == JZ:
+      stack.append((iter(t[1]), (code_.emit(JZ, 0, t[2]), t[3])))
+    else:
+      code_.emit(t[0], t[1], t[3], t[2])
+
+################################ PATTERNS ###############################
+def is_clear(body_):
+  ''' [-] or [+] (any odd step reaches zero eventually) '''
+
+  return len(body_) == 1 and body_[0][0] == ADD and body_[0][1] % 2 == 1
+
+def is_scan(body_):
+  ''' [>] / [<] / [>>>] ... '''
+
+  return len(body_) == 1 and body_[0][0] == MOVE and body_[0][1] != 0
+
+def mul_targets(body_):
+  ''' [->+>++<<] like loops, return list of (offset, factor) or None '''
+
+  step = 0 # change of the loop counter cell per iteration
+  targets = list()
+
+  for t in body_: # folded body must contain nothing but additions
+    if t[0] == ADD:
+      step += t[1]
+    elif t[0] == ADDO and t[2] != 0:
+      targets.append((t[2], t[1]))
+    else:
+      return None
+
+  if step % 256 == 255: # counter decremented => iterations == value
+    return [(o, f) for o, f in targets]
+  if step % 256 == 1: # counter incremented => iterations == -value
+    return [(o, -f) for o, f in targets]
+  return None
+
+################################ FOLDING ################################
+def fold(block_, stats_):
+  ''' Fold pointer moves of straight code into offset addressed ops '''
+
+  ret = list()
+  pend = dict() # offset -> [op, arg, src] waiting to be emitted
+  cur = 0 # pointer offset relative to block start
+  low = 0 # lowest offset the pointer reached
+  moves = 0 # number of folded MOVE instructions
+  src = block_[0][3]
+
+  def put(o_):
+    ''' Emit pending op for offset o_ '''
+
+    op, arg, s = pend.pop(o_)
+    if op == SET:
+      ret.append((SET, arg % 256, o_, s))
+    elif arg % 256:
+      ret.append((ADDO if o_ else ADD, arg % 256, o_, s))
+
+  for op, arg, off, s in block_:
+    o = cur + off
+    if op == MOVE:
+      cur += arg
+      low = min(low, cur)
+      moves += 1
+    elif op == ADD or op == ADDO:
+      if o in pend:
+        pend[o][1] += arg
+      else:
+        pend[o] = [ADD, arg, s]
+    elif op == SET:
+      pend[o] = [SET, arg, s]
+    else: # I/O needs the cell up to date, other cells may wait
+      if o in pend:
+        put(o)
+      ret.append((op, arg, o, s))
+
+  for o in sorted(pend):
+    put(o)
+
+  touched = [t[2] for t in ret]
+  if low < min([cur, 0] + touched): # pointer went further left than the
+    ret.insert(0, (MOVE, -low, 0, src)) # ops do, keep the check (it
+    ret.insert(0, (MOVE, low, 0, src)) # raises in strict mode)
+  if cur:
+    ret.append((MOVE, cur, 0, block_[-1][3]))
+    moves -= 1
+
+  stats_['fold'] += max(moves, 0)
+  return ret
+
+############################### OPTIMIZER ###############################
+class Frame():
+  ''' Loop body being optimized '''
+
+  def __init__(self, level_, stats_, beg_=None):
+    self.ret = list() # optimized code
+    self.block = list() # straight code waiting for folding
+    self.level = level_
+    self.stats = stats_
+    self.beg = beg_ # source offset of the loop start
+
+  def flush(self):
+    ''' Fold and emit pending straight code '''
+
+    if self.block and self.level >= 2:
+      self.ret.extend(fold(self.block, self.stats))
+    else:
+      self.ret.extend(self.block)
+    self.block = list()
+
+  def close(self):
+    ''' Return optimized body '''
+
+    self.flush()
+    return self.ret
+
+  def loop(self, body_, beg_, end_):
+    ''' Append loop (already optimized body_), rewrite it if possible '''
+
+    if self.level >= 1 and is_clear(body_):
+      self.stats['clear'] += 1
+      self.block.append((SET, 0, 0, beg_))
+    elif self.level >= 1 and is_scan(body_):
+      self.stats['scan'] += 1
+      self.flush()
+      self.ret.append((SCAN, body_[0][1], 0, beg_))
+    elif self.level >= 2 and mul_targets(body_) is not None:
+      self.stats['mul'] += 1
+      self.flush()
+      for o, f in mul_targets(body_):
+        self.ret.append((MUL, f % 256, o, beg_))
+      self.ret.append((SET, 0, 0, end_))
+    else:
+      self.flush()
+      self.ret.append((JZ, body_, beg_, end_))
+
+def optimize(code_, level_=1):
+  ''' Return optimized copy of Bytecode code_, stats in .rewrites '''
+
+  if level_ not in LEVELS:
+    raise ValueError("unknown optimization level " + str(level_))
+
+  stats = dict((r, 0) for r in REWRITES)
+  stack = [Frame(level_, stats)] # innermost loop on top
+  halt = 0 # source offset of the final HALT
+
+  for i in range(0, len(code_)): # bodies are optimized bottom up
+    op = code_.ops[i]
+    if op == JZ:
+      stack.append(Frame(level_, stats, code_.src[i]))
+    elif op == JNZ:
+      f = stack.pop()
+      stack[-1].loop(f.close(), f.beg, code_.src[i])
+    elif op == HALT:
+      halt = code_.src[i]
+      break
+    else:
+      stack[-1].block.append((op, code_.args[i], code_.offs[i], \
+        code_.src[i]))
+
+  ret = Bytecode()
+  emit(stack[0].close(), ret)
+  ret.emit(HALT, 0, halt)
+  ret.stdin = code_.stdin
+  ret.clamp = level_ < 2
+  ret.rewrites = stats
+
+  return ret
+
+def report(code_):
+  ''' Return one line summary of rewrites applied to code_ '''
+
+  return 'optimizer: ' + ', '.join('{0}={1}'.format(r, code_.rewrites[r]) \
+    for r in REWRITES if r in code_.rewrites)
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "OPTIMIZER can only be imported, not run!")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Partial evaluation of the input-independent prefix of BrainFuck programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Everything a program does before its first , is the same in every run
+  started on an empty tape: tables built, banners printed. The prefix is
+  run once at compile time (at most a given number of instructions, it
+  ends at a loop edge then) and the program is replaced by its residual:
+  Bytecode doing the rest, with .prefix = (instructions, cells, pointer,
+  output) of the evaluated part. A run loads the cells, writes the output
+  and executes the residual, which is a program of its own: when the
+  prefix stopped inside loops, the rest of every enclosing body is
+  followed by a copy of the whole loop (the jump back of the original
+  becomes the test of the copy, instructions executed stay the same), so
+  every engine can compile it.
+  Prefixes moving left of cell 0 or growing the tape over CELLS cells are
+  not evaluated.
+'''
+
+# IMPORTS
+import std, tape, sink, reader
+from bytecode import Bytecode, JZ, JNZ, Suspend, execute
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+CELLS = 1 << 24 # max cells of the tape of an evaluated prefix
+
+################################# INPUT #################################
+class Stop(reader.Reader):
+  ''' Reader ending the prefix, the , is executed by the residual '''
+
+  def read(self, n_, v_):
+    raise Suspend('input')
+
+############################### RESIDUAL ################################
+def residual(code_, ip_):
+  ''' Return Bytecode doing what code_ does from instruction ip_ on '''
+
+  stack = list() # JZ of loops enclosing ip_
+  for i in range(0, ip_):
+    if code_.ops[i] == JZ:
+      stack.append(i)
+    elif code_.ops[i] == JNZ:
+      stack.pop()
+
+  order = list() # instructions of the residual
+  i = ip_
+  for j in reversed(stack): # rest of the body, then the loop again
+    end = code_.args[j] - 1 # its JNZ
+    order += range(i, end)
+    order += range(j, end + 1)
+    i = end + 1
+  order += range(i, len(code_))
+
+  ret = Bytecode()
+  loops = list() # JZ of the residual waiting for their JNZ
+  for i in order:
+    k = ret.emit(code_.ops[i], code_.args[i], code_.src[i], code_.offs[i])
+    if code_.ops[i] == JZ:
+      loops.append(k)
+    elif code_.ops[i] == JNZ:
+      b = loops.pop()
+      ret.args[b] = k + 1
+      ret.args[k] = b + 1
+  ret.stdin = code_.stdin
+  ret.clamp = code_.clamp
+  ret.rewrites = dict(code_.rewrites)
+  return ret
+
+############################## EVALUATION ###############################
+def evaluate(code_, budget_):
+  ''' Return residual of Bytecode code_ after its input-independent prefix
+      (at most budget_ instructions), code_ itself if there is none '''
+
+  t = tape.Tape(b'\x00', True) # moves left of cell 0 are noticed
+  t.cap = CELLS
+  out = sink.Sink('capture')
+
+  def check(n_):
+    ''' End the prefix once the budget is used up '''
+
+    if n_ >= budget_:
+      raise Suspend('slice')
+    return budget_
+
+  try:
+    ip = len(code_) - 1 # HALT, the whole program is the prefix ...
+    n = execute(code_, t, out, Stop(), check)
+  except Suspend as e: # ... or it stopped at , or a loop edge
+    ip, n = e.ip, e.steps
+  except (IndexError, MemoryError):
+    return code_
+  if not n or t.low:
+    return code_
+
+  m, p = t.memory()
+  ret = residual(code_, ip)
+  ret.prefix = (n, bytes(m), p, out.getvalue())
+  return ret
+
+def report(code_):
+  ''' Return one line summary of the evaluated prefix of code_ '''
+
+  n, m, p, s = code_.prefix
+  return 'prefix: {0} instructions evaluated, {1} cells, {2} bytes of ' \
+    'output'.format(n, len(m), len(s))
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "PARTIAL can only be imported, not run!")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Execution profiles of BrainFuck programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  A profiled run executes a Python translation of the bytecode that only
+  counts iterations of every loop (see codegen.translate). Everything
+  else follows from these counters, because each instruction runs exactly
+  as many times as the body of its innermost loop (once at top level):
+  executions per instruction type, entries, iterations and cumulative
+  steps of every loop, output written and input requested. Loops are
+  identified by source offsets of their [ and ] (keys of the dict form).
+  With optimization the profile covers the loops that were kept as loops.
+'''
+
+# IMPORTS
+import std, sys, json
+from bytecode import HALT, OUT, IN, JZ, JNZ, op_names
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+TOP = 20 # loops listed in the text report
+
+################################ PROFILE ################################
+class Profile():
+  ''' Counters of one run of Bytecode '''
+
+  def __init__(self, code_, iters_, cells_):
+    ''' Derive counters of code_ from iterations of loops iters_ (indexed
+        by their JZ), tape high-water mark cells_ '''
+
+    self.rewrites = dict(code_.rewrites) # what the optimizer did
+    self.ops = dict() # instruction name -> executions
+    self.loops = list() # [begin, end, entries, iterations, steps]
+    self.output = 0 # bytes written
+    self.input = 0 # bytes requested by ,
+    self.cells = cells_
+
+    stack = [[None, 1, 0]] # [loop, executions of its body, steps so far]
+    for i in range(0, len(code_)):
+      op, a = code_.ops[i], code_.args[i]
+      if op == HALT:
+        break
+      e = stack[-1][1] # executions of this instruction
+      if op == JZ:
+        loop = [code_.src[i], None, e, iters_[i], e]
+        self.loops.append(loop)
+        stack.append([loop, iters_[i], 0])
+      elif op == JNZ: # runs once per iteration
+        loop, e, steps = stack.pop()
+        loop[1] = code_.src[i]
+        loop[4] += steps + e
+        stack[-1][2] += loop[4]
+      else:
+        stack[-1][2] += e
+        if op == OUT:
+          self.output += e * a
+        elif op == IN:
+          self.input += e * a
+      self.ops[op_names[op]] = self.ops.get(op_names[op], 0) + e
+
+    self.steps = stack[0][2] # instructions executed
+
+  def json(self):
+    ''' Return profile as dict ready for json.dumps '''
+
+    return { 'steps': self.steps, 'cells': self.cells,
+             'output': self.output, 'input': self.input,
+             'rewrites': self.rewrites, 'instructions': self.ops,
+             'loops': [dict(zip(('begin', 'end', 'entries', 'iterations', \
+               'steps'), l)) for l in self.hot()] }
+
+  def hot(self):
+    ''' Loops from the one executing most instructions '''
+
+    return sorted(self.loops, key=lambda l: (-l[4], l[0]))
+
+  def report(self, top_=TOP):
+    ''' Return human readable report, top_ hottest loops '''
+
+    s = max(self.steps, 1)
+    ret = ['profile: {0} instructions, {1} cells, {2} bytes out, {3} '
+           'bytes in'.format(self.steps, self.cells, self.output, \
+           self.input), 'instructions:']
+    for name, n in sorted(self.ops.items(), key=lambda o: (-o[1], o[0])):
+      ret.append('  {0:>5} {1:>14} {2:6.2f}%'.format(name, n, 100 * n / s))
+    ret.append('loops (by steps, source offsets of [ and ]):')
+    for b, e, entries, n, steps in self.hot()[:top_]:
+      ret.append('  [{0:>7} ]{1:>7} {2:>12} entries {3:>14} iterations '
+        '{4:>14} steps {5:6.2f}%'.format(b, e, entries, n, steps, \
+        100 * steps / s))
+    if len(self.loops) > top_:
+      ret.append('  ... {0} more'.format(len(self.loops) - top_))
+    return '\n'.join(ret)
+
+################################ OUTPUT #################################
+def dump(profile_, text_=True, json_=None):
+  ''' Print report of profile_ to stderr (if text_), save it as JSON into
+      file json_ (if set, - means stdout) '''
+
+  if text_:
+    print(profile_.report(), file=sys.stderr)
+  if json_ == '-':
+    print(json.dumps(profile_.json(), sort_keys=True))
+  elif json_ is not None:
+    with open(json_, 'w') as f:
+      json.dump(profile_.json(), f, indent=2, sort_keys=True)
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "PROFILER can only be imported, not run!")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Input for BrainFuck programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Input embedded in the source after ! is used if there is any, stdin
+  (or a file / named pipe) otherwise. Both are consumed through a cursor
+  into a memoryview, stdin is read in large chunks.
+  EOF policies:
+    keep  - leave the cell unchanged
+    zero  - write 0 into the cell
+    minus - write -1 (255) into the cell
+'''
+
+# IMPORTS
+import std, sys
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+EOF_POLICIES = { 'keep': None, 'zero': 0, 'minus': 255 } # value at EOF
+BUFSIZE = 65536 # max bytes read at once
+
+################################ READER #################################
+class Reader():
+  ''' Source of everything the program reads with , '''
+
+  def __init__(self, path_=None, eof_='keep', size_=BUFSIZE, out_=None):
+    ''' Create reader of file path_ (None or '-' means stdin) '''
+
+    if eof_ not in EOF_POLICIES:
+      raise ValueError("unknown EOF policy " + str(eof_))
+    if size_ < 1:
+      raise ValueError("buffer size must be positive")
+
+    self.eof = EOF_POLICIES[eof_]
+    self.size = size_
+    self.out = out_ # sink flushed before waiting for input
+    self.buf = memoryview(b'') # data read but not consumed yet ...
+    self.pos = 0 # ... and cursor into it
+    self.embedded = False # input comes from the source itself
+    self.done = False # EOF reached
+    self.file = None # file opened by us
+    if path_ is not None and path_ != '-':
+      self.file = open(path_, 'rb', buffering=0)
+
+  def embed(self, data_):
+    ''' Use data_ (input after ! in the source) instead of stdin '''
+
+    if isinstance(data_, str):
+      data_ = bytes(ord(c) % 256 for c in data_)
+    self.buf = memoryview(data_)
+    self.pos = 0
+    self.embedded = True
+    self.done = False
+
+  def fill(self):
+    ''' Read next chunk of input, return False at EOF '''
+
+    if self.embedded or self.done:
+      return False
+    if self.out is not None:
+      self.out.reading()
+
+    if self.file is not None:
+      data = self.file.read(self.size)
+    elif hasattr(sys.stdin, 'buffer'): # whatever is available right now
+      data = sys.stdin.buffer.read1(self.size)
+    else: # stdin replaced by a text stream
+      data = bytes(ord(c) % 256 for c in sys.stdin.read(self.size))
+
+    if not data:
+      self.done = True
+      return False
+    self.buf = memoryview(data)
+    self.pos = 0
+    return True
+
+  def read(self, n_, v_):
+    ''' Execute , instruction(s), return new value of cell holding v_ '''
+
+    while n_:
+      left = len(self.buf) - self.pos
+      if not left:
+        if not self.fill():
+          return v_ if self.eof is None else self.eof
+        left = len(self.buf)
+      n = min(n_, left)
+      self.pos += n
+      n_ -= n
+      v_ = self.buf[self.pos - 1]
+
+    return v_
+
+  def close(self):
+    ''' Close input file (if we opened it) '''
+
+    if self.file is not None:
+      self.file.close()
+      self.file = None
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "READER can only be imported, not run!")
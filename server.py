@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Local server running sessions of one BrainFuck program (and its client)
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  The program is compiled once, every connection (TCP or Unix socket) is
+  a session: a run of the program with a tape of its own, reading what
+  the client sends and sending back what the program writes. Sessions are
+  asyncio tasks of one process (see aio), so thousands of players of an
+  interactive program need no more than one CPU and their tapes.
+  Addresses: PORT or HOST:PORT (TCP, host defaults to 127.0.0.1) or a path
+  of a Unix socket (anything with a /).
+'''
+
+# IMPORTS
+import std, os, sys, socket, threading, asyncio, brainx, reader, tape, \
+       cache, aio
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+HOST = '127.0.0.1' # default host of TCP addresses
+BACKLOG = 4096 # connections waiting to be accepted
+
+################################ ADDRESS ################################
+def address(addr_):
+  ''' Return (socket family, address) of addr_ '''
+
+  if '/' in addr_:
+    return socket.AF_UNIX, addr_
+  host, sep, port = addr_.rpartition(':')
+  if not port.isdigit():
+    raise ValueError("invalid address " + addr_)
+  return socket.AF_INET, (host or HOST, int(port))
+
+################################ SERVER #################################
+async def session(program_, a_, reader_, writer_):
+  ''' Run program_ for a client connected through streams reader_ and
+      writer_ (parsed arguments a_ give tape and limits) '''
+
+  mem = tape.create(a_['tape'], left_=a_['left'])
+  try:
+    await program_.run_async(reader_, writer_, mem, \
+      step_limit=a_['max_steps'], time_limit=a_['timeout'], \
+      tape_limit=a_['max_tape'], eof=a_['eof'], \
+      slice_steps=a_['slice'] or aio.SLICE)
+  except brainx.BrainError as e: # tell the client, keep serving others
+    e.result = None # may be a view of the tape closed below
+    try:
+      writer_.write((std.create_error_msg("PYTHON", e) + '\n').\
+        encode('utf-8'))
+      await writer_.drain()
+    except OSError:
+      pass
+  finally:
+    mem.close()
+    writer_.close()
+
+async def serve(program_, a_):
+  ''' Accept sessions of program_ on address a_['serve'] forever '''
+
+  family, where = address(a_['serve'])
+  handler = lambda r, w: session(program_, a_, r, w)
+  if family == socket.AF_UNIX:
+    s = await asyncio.start_unix_server(handler, where, backlog=BACKLOG)
+  else:
+    s = await asyncio.start_server(handler, where[0], where[1], \
+                                   backlog=BACKLOG)
+  print('serving ' + str(a_['source']) + ' on ' + a_['serve'], \
+        file=sys.stderr, flush=True)
+  async with s:
+    await s.serve_forever()
+
+def main(a_):
+  ''' Compile program of parsed arguments a_, serve it until interrupted '''
+
+  c = None
+  try: # sessions run bytecode, python/native code would not be used
+    if a_['cache'] and not a_['no_cache']:
+      c = cache.Cache(a_['cache'], a_['cache_limit'], a_['rebuild_cache'])
+    p = brainx.compile(a_['source'], a_['type'], 'dict' if \
+      a_['engine'] == 'dict' else 'array', a_['optimize'], c, a_['prefix'])
+    p.array_code()
+  except brainx.BrainError as e:
+    std.exit_failure(e.code, std.create_error_msg("PYTHON", e))
+  except (ValueError, OSError) as e:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", e))
+  finally:
+    if c is not None:
+      c.close()
+
+  try:
+    asyncio.run(serve(p, a_))
+  except KeyboardInterrupt:
+    pass
+  except (ValueError, OSError) as e:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", e))
+
+################################ CLIENT #################################
+def client(addr_):
+  ''' Connect stdin and stdout to a session on server addr_ '''
+
+  try:
+    family, where = address(addr_)
+    s = socket.socket(family, socket.SOCK_STREAM)
+    s.connect(where)
+  except (ValueError, OSError) as e:
+    std.exit_failure("INVALID_CODE", std.create_error_msg("PYTHON", e))
+
+  def send():
+    ''' Copy stdin to the session, then tell it there is no more '''
+
+    try:
+      for data in iter(lambda: os.read(0, reader.BUFSIZE), b''):
+        s.sendall(data)
+      s.shutdown(socket.SHUT_WR)
+    except OSError: # session ended meanwhile
+      pass
+
+  threading.Thread(target=send, daemon=True).start()
+  for data in iter(lambda: s.recv(reader.BUFSIZE), b''):
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+  s.close()
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "SERVER can only be imported, not run!")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Output sinks for BrainFuck programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Modes:
+    fd      - buffered binary writes to a file descriptor (stdout)
+    tee     - fd + keep the whole output in memory (BrainFuck.output)
+    capture - keep the output in memory, print nothing
+    discard - throw the output away
+  Flush policies (fd and tee only):
+    size  - when the buffer is full
+    line  - on newline, before reading input and when the buffer is full
+    input - before reading input and when the buffer is full
+'''
+
+# IMPORTS
+import std, os, sys
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+MODES = ('fd', 'tee', 'capture', 'discard')
+POLICIES = ('size', 'line', 'input')
+BUFSIZE = 65536 # default buffer size in bytes
+
+################################# SINK ##################################
+class Sink():
+  ''' Destination of everything the program writes with . '''
+
+  def __init__(self, mode_='tee', policy_='line', size_=BUFSIZE, fd_=None):
+    ''' Create sink, fd_ None means sys.stdout '''
+
+    if mode_ not in MODES:
+      raise ValueError("unknown output mode " + str(mode_))
+    if policy_ not in POLICIES:
+      raise ValueError("unknown flush policy " + str(policy_))
+    if size_ < 1:
+      raise ValueError("buffer size must be positive")
+
+    self.mode = mode_
+    self.policy = policy_
+    self.size = size_
+    self.fd = fd_
+    self.printing = mode_ in ('fd', 'tee') # goes to fd at all?
+    self.buf = list() # chunks waiting for flush
+    self.pending = 0 # their total length
+    self.kept = list() if mode_ in ('tee', 'capture') else None # all output
+
+  def write(self, s_):
+    ''' Execute . instruction(s) '''
+
+    if self.kept is not None:
+      self.kept.append(s_)
+    if not self.printing:
+      return
+    self.buf.append(s_)
+    self.pending += len(s_)
+    if self.pending >= self.size or \
+       (self.policy == 'line' and '\n' in s_):
+      self.flush()
+
+  def reading(self):
+    ''' Program is about to wait for input, show what it has written '''
+
+    if self.policy != 'size':
+      self.flush()
+
+  def flush(self):
+    ''' Write out the buffer '''
+
+    if not self.buf:
+      return
+    data = ''.join(self.buf)
+    self.buf = list()
+    self.pending = 0
+
+    if self.fd is not None:
+      data = memoryview(data.encode('latin-1'))
+      while data:
+        data = data[os.write(self.fd, data):]
+    elif hasattr(sys.stdout, 'buffer'): # cells are bytes, not unicode
+      sys.stdout.flush()
+      sys.stdout.buffer.write(data.encode('latin-1'))
+      sys.stdout.buffer.flush()
+    else: # stdout replaced by a text stream
+      sys.stdout.write(data)
+      sys.stdout.flush()
+
+  def close(self):
+    ''' Flush whatever is left, called when the program ends '''
+
+    self.flush()
+
+  def getvalue(self):
+    ''' Return kept output ('' when the mode keeps nothing) '''
+
+    if not self.kept:
+      return str()
+    if len(self.kept) > 1: # join once, later calls are cheap
+      self.kept = [''.join(self.kept)]
+    return self.kept[0]
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "SINK can only be imported, not run!")
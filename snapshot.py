@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Snapshots of running BrainFuck programs (checkpoint and resume)
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  A run with a Checkpoint executes bytecode, which stops at a loop edge
+  (bytecode.Suspend) every N instructions, every N seconds and when the
+  process gets SIGUSR1; everything the run needs to continue is then saved
+  into a compact file: instruction pointer, instructions executed, program
+  memory and pointer, input read but not consumed yet (the rest of the
+  input embedded in the source). SIGTERM saves a snapshot and stops the
+  run (Stopped), so it can be resumed later or on another machine.
+  Output written so far is flushed before every snapshot; input that the
+  program did not read yet must be given to the resumed run again.
+  A snapshot holds the hash of the bytecode it was taken of and cannot be
+  resumed with different code (other source or optimization level).
+'''
+
+# IMPORTS
+import std, os, sys, time, signal, hashlib, marshal, tempfile, zlib, \
+       bytecode, cache
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+MAGIC = b'BFSNAP\n' # first bytes of snapshot files
+FORMAT = 1 # version of the snapshot layout
+SAVE = signal.SIGUSR1 # signal saving a snapshot
+STOP = signal.SIGTERM # signal saving a snapshot and stopping the run
+
+############################# E - STOPPED ###############################
+class Stopped(Exception):
+  ''' EXCEPTION: run stopped on request after its snapshot was saved '''
+
+  def __init__(self, path_, steps_):
+    Exception.__init__(self, 'run stopped, snapshot saved to ' + path_)
+    self.path = path_
+    self.steps = steps_
+
+############################### SNAPSHOT ################################
+def digest(code_):
+  ''' Return hash of Bytecode code_ '''
+
+  return hashlib.sha256(marshal.dumps(cache.pack(code_))).hexdigest()
+
+class Snapshot():
+  ''' State of a suspended run '''
+
+  def __init__(self, digest_, ip_, steps_, cells_, pointer_, input_=b'', \
+               embedded_=False, done_=False):
+    self.digest = digest_ # hash of the bytecode
+    self.ip = ip_ # instruction executed next
+    self.steps = steps_ # instructions executed so far
+    self.cells = cells_ # program memory (bytes) ...
+    self.pointer = pointer_ # ... and pointer into it
+    self.input = input_ # read but not consumed yet
+    self.embedded = embedded_ # input comes from the source
+    self.done = done_ # EOF reached
+
+  def restore(self, code_, tape_, in_):
+    ''' Put state into tape_ and reader in_ of a run of code_, raise
+        ValueError if the snapshot was taken of other code '''
+
+    if digest(code_) != self.digest:
+      raise ValueError("snapshot was taken of a different program (or " + \
+        "optimization level)")
+    tape_.load(self.cells, self.pointer)
+    in_.buf = memoryview(self.input)
+    in_.pos = 0
+    in_.embedded = self.embedded
+    in_.done = self.done
+
+  def save(self, path_):
+    ''' Write snapshot into file path_ (atomically) '''
+
+    data = MAGIC + zlib.compress(marshal.dumps((FORMAT, self.digest, \
+      self.ip, self.steps, self.cells, self.pointer, self.input, \
+      self.embedded, self.done)))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path_)))
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+      os.replace(tmp, path_)
+    except OSError:
+      os.unlink(tmp)
+      raise
+
+def take(digest_, tape_, in_, ip_, steps_):
+  ''' Return Snapshot of a run of code with hash digest_ suspended at ip_ '''
+
+  m, p = tape_.memory()
+  cells = bytes(m)
+  m = None # may be a view of the tape
+  return Snapshot(digest_, ip_, steps_, cells, p, \
+    bytes(in_.buf[in_.pos:]), in_.embedded, in_.done)
+
+def load(path_):
+  ''' Return Snapshot saved into file path_, raise ValueError if it is
+      not one '''
+
+  with open(path_, 'rb') as f:
+    data = f.read()
+  if not data.startswith(MAGIC):
+    raise ValueError(path_ + " is not a snapshot")
+  try:
+    s = marshal.loads(zlib.decompress(data[len(MAGIC):]))
+  except (zlib.error, EOFError, TypeError) as e:
+    raise ValueError(path_ + " is damaged: " + str(e))
+  if s[0] != FORMAT:
+    raise ValueError(path_ + " has unknown format " + str(s[0]))
+  return Snapshot(*s[1:])
+
+############################## CHECKPOINT ###############################
+class Checkpoint():
+  ''' Where and when snapshots of a run are saved: file path_, every
+      steps_ instructions, every seconds_ seconds, on signals '''
+
+  def __init__(self, path_, steps_=None, seconds_=None, signals_=True):
+    self.path = path_
+    self.steps = steps_
+    self.seconds = seconds_
+    self.signals = signals_
+    self.request = None # reason of a snapshot asked for by a signal
+    self.saved = 0 # snapshots saved
+
+  def handle(self, signum_, frame_):
+    ''' Signal handler, the snapshot is taken at the next loop edge '''
+
+    self.request = 'stop' if signum_ == STOP else 'checkpoint'
+
+  def install(self):
+    ''' Install signal handlers, return the previous ones '''
+
+    if not self.signals:
+      return dict()
+    try:
+      return dict((s, signal.signal(s, self.handle)) for s in (SAVE, STOP))
+    except ValueError: # not the main thread, no signals then
+      return dict()
+
+  def checker(self, check_, n_):
+    ''' Return limits check (see bytecode.budget) calling check_ that also
+        suspends the run when a snapshot is due (instructions executed
+        so far n_) '''
+
+    poll = self.signals or self.seconds is not None # clock, signals
+    mark = n_ + self.steps if self.steps else sys.maxsize
+    at = time.monotonic() + self.seconds if self.seconds else None
+
+    def check(n_):
+      ''' Raise LimitError or Suspend or return when to be called next '''
+
+      nonlocal mark, at
+      due = check_(n_)
+      if self.request or n_ >= mark or \
+         (at is not None and time.monotonic() >= at):
+        e = bytecode.Suspend(self.request or 'checkpoint')
+        self.request = None
+        if self.steps:
+          mark = n_ + self.steps
+        if at is not None:
+          at = time.monotonic() + self.seconds
+        raise e
+      return min(due, mark, n_ + bytecode.CHECK if poll else sys.maxsize)
+
+    return check
+
+############################### EXECUTION ###############################
+def execute(code_, tape_, out_, in_, check_=None, point_=None, ip_=0, \
+            n_=0):
+  ''' Run Bytecode code_ from ip_ with n_ instructions executed (see
+      bytecode.execute), save snapshots as Checkpoint point_ asks; return
+      number of instructions executed, raise Stopped after saving the
+      snapshot asked for by STOP '''
+
+  if point_ is None:
+    return bytecode.execute(code_, tape_, out_, in_, check_, ip_, n_)
+
+  check = point_.checker(check_ if check_ is not None else \
+    bytecode.budget(), n_)
+  h = digest(code_)
+  old = point_.install()
+  ip, n = ip_, n_ # where the run continues
+  try:
+    while 1:
+      try:
+        return bytecode.execute(code_, tape_, out_, in_, check, ip, n)
+      except bytecode.Suspend as e:
+        ip, n = e.ip, e.steps
+        out_.flush()
+        take(h, tape_, in_, ip, n).save(point_.path)
+        point_.saved += 1
+        if e.reason == 'stop':
+          raise Stopped(point_.path, n)
+  finally:
+    for s, f in old.items():
+      signal.signal(s, f)
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "SNAPSHOT can only be imported, not run!")
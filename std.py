@@ -15,6 +15,18 @@ __version__ = "0.2"
 __license__ = "GNU GPL v3"
 __year__    = "2013"
 
+EXIT_CODES = { "INVALID_CODE": 1,
+               "BF_PROCESS_INPUT": 10,
+               "BF_EXECUTE_CODE": 15,
+               "BF_STEP_LIMIT": 16,
+               "BF_TIME_LIMIT": 17,
+               "BF_TAPE_LIMIT": 18,
+               "BF_STOPPED": 19,
+               "BL_DECODE_PNG": 20,
+               "BL_PROCESS_INPUT": 25,
+               "BC_DECODE_PNG": 30,
+               "BC_PROCESS_INPUT": 35 }
+
 ############################ STANDARD HELPERS ###########################
 def pa():
   ''' Parse arguments and return them '''
@@ -26,8 +38,10 @@ def pa():
     '''Please report bugs (bugs, what's that?) to ''' + __email__)
 
   # source
-  p.add_argument('source', help='''path to program source file or ''' +
-    '''the source code itself''')
+  p.add_argument('source', nargs='*', help='''path to program source ''' +
+    '''file or the source code itself; with --batch any number of ''' +
+    '''files, directories and @manifests (lines "path [F|L|C]"), none ''' +
+    '''with --connect, any with --daemon''')
   
   # -V / --version
   p.add_argument('-V', '--version', action='version', version='%(prog)s '
@@ -37,26 +51,274 @@ def pa():
   p.add_argument('-t', '--type', default='F', choices=['F', 'L', 'C'],
       help='''intepret program as brainFuck/brainLoller/brainCopter''')
 
-  return vars(p.parse_args())
+  # -e / --engine
+  p.add_argument('-e', '--engine', default='array',
+      choices=['dict', 'array', 'python', 'native', 'tiered'],
+      help='''execution engine: dict (reference), array (bytecode), ''' +
+      '''python (translated to Python source and compiled), native ''' +
+      '''(translated to C, needs a C compiler) or tiered (bytecode, ''' +
+      '''hot loops compiled to Python while running)''')
+
+  # --tier-threshold
+  p.add_argument('--tier-threshold', default=None, type=int, metavar='N',
+      help='''iterations after which the tiered engine compiles a loop ''' +
+      '''(default 1000); -r prints its statistics''')
+
+  # --memo
+  p.add_argument('--memo', default=None, type=int, metavar='WINDOW',
+      help='''array engine: replay loops doing no I/O and moving the ''' +
+      '''pointer back, touching at most WINDOW cells, from a cache of ''' +
+      '''their results; -r prints its hit rate''')
+
+  # --memo-entries
+  p.add_argument('--memo-entries', default=None, type=int, metavar='N',
+      help='''windows kept by --memo, least recently used go first ''' +
+      '''(default 4096)''')
+
+  # -O / --optimize
+  p.add_argument('-O', '--optimize', default=1, type=int, choices=[0, 1, 2],
+      help='''optimization level: 0 (none), 1 (clear/scan loops, exact) ''' +
+      '''or 2 (+ offset folding, multiply loops, no pointer clamping)''')
+
+  # -p / --prefix
+  p.add_argument('-p', '--prefix', default=None, type=int, metavar='STEPS',
+      help='''evaluate the program up to its first input (at most ''' +
+      '''STEPS instructions) at compile time, runs start after it ''' +
+      '''(cached with the program)''')
+
+  # -r / --report
+  p.add_argument('-r', '--report', action='store_true',
+      help='''print rewrites applied by the optimizer to stderr''')
+
+  # -s / --sink
+  p.add_argument('-s', '--sink', default='fd', choices=['fd', 'discard'],
+      help='''program output: fd (buffered writes to stdout) or ''' +
+      '''discard (throw it away)''')
+
+  # -f / --flush
+  p.add_argument('-f', '--flush', default='line',
+      choices=['size', 'line', 'input'],
+      help='''flush buffered output only when the buffer is full ''' +
+      '''(size), also on newline and before reading input (line) or ''' +
+      '''also before reading input (input)''')
+
+  # -b / --buffer
+  p.add_argument('-b', '--buffer', default=65536, type=int,
+      help='''output buffer size in bytes''')
+
+  # -i / --input
+  p.add_argument('-i', '--input', default=None,
+      help='''read program input from file or named pipe instead of ''' +
+      '''stdin (input embedded in the source after ! still wins)''')
+
+  # -E / --eof
+  p.add_argument('-E', '--eof', default='keep',
+      choices=['keep', 'zero', 'minus'],
+      help='''cell value after reading at EOF: keep (unchanged), ''' +
+      '''zero (0) or minus (-1, i.e. 255)''')
+
+  # -T / --tape
+  p.add_argument('-T', '--tape', default='flat',
+      choices=['flat', 'sparse', 'mmap'],
+      help='''memory tape: flat (one growing array), sparse (page ''' +
+      '''table, for widely scattered cells) or mmap (memory mapped, ''' +
+      '''for huge tapes)''')
+
+  # --tape-file
+  p.add_argument('--tape-file', default=None,
+      help='''file backing the mmap tape (anonymous mapping if omitted)''')
+
+  # -c / --cache
+  p.add_argument('-c', '--cache', default=os.environ.get('BF_CACHE_DIR'),
+      help='''directory caching compiled programs and programs ''' +
+      '''extracted from images (default $BF_CACHE_DIR''' +
+      ''', no caching if unset)''')
+
+  # --cache-limit
+  p.add_argument('--cache-limit', default=256 << 20, type=int,
+      help='''size limit of the cache directory in bytes''')
+
+  # --cache-stats
+  p.add_argument('--cache-stats', action='store_true',
+      help='''print hits/misses of this run and counters of the cache ''' +
+      '''to stderr''')
+
+  # --no-cache
+  p.add_argument('--no-cache', action='store_true',
+      help='''do not use the cache (even if $BF_CACHE_DIR is set)''')
+
+  # --rebuild-cache
+  p.add_argument('--rebuild-cache', action='store_true',
+      help='''ignore cached programs, translate them again and store them''')
+
+  # --batch
+  p.add_argument('--batch', action='store_true',
+      help='''run every program in the sources in a process pool and ''' +
+      '''print a JSON line of results for each to stdout''')
+
+  # -w / --workers
+  p.add_argument('-w', '--workers', default=os.cpu_count(), type=int,
+      help='''number of worker processes in batch and daemon mode ''' +
+      '''(default: ''' +
+      '''number of CPUs)''')
+
+  # --chunksize
+  p.add_argument('--chunksize', default=1, type=int,
+      help='''programs handed to a worker at once in batch mode''')
+
+  # --inputs
+  p.add_argument('--inputs', default=None, metavar='FILE',
+      help='''run the program once for every line of FILE (with its ''' +
+      '''newline) as input, many runs at once in lockstep (with ''' +
+      '''NumPy), print a JSON line of results for each to stdout''')
+
+  # --lanes
+  p.add_argument('--lanes', default=1024, type=int, metavar='N',
+      help='''runs executed together by --inputs''')
+
+  # --bench
+  p.add_argument('--bench', action='store_true',
+      help='''benchmark the example programs in the source ''' +
+      '''directories (other sources as they are) and synthetic ''' +
+      '''programs, print median and variance of every phase''')
+
+  # --bench-engines
+  p.add_argument('--bench-engines', default='dict,array,python,native',
+      help='''comma separated engines to benchmark''')
+
+  # --repeat
+  p.add_argument('--repeat', default=3, type=int,
+      help='''times every phase is measured in benchmarks''')
+
+  # --baseline
+  p.add_argument('--baseline', default=None, metavar='FILE',
+      help='''compare benchmark with JSON baseline FILE''')
+
+  # --save-baseline
+  p.add_argument('--save-baseline', default=None, metavar='FILE',
+      help='''save benchmark results as JSON baseline FILE''')
+
+  # --threshold
+  p.add_argument('--threshold', default=0.1, type=float,
+      help='''slowdown against the baseline reported as regression ''' +
+      '''(0.1 means 10%%)''')
+
+  # --max-steps
+  p.add_argument('--max-steps', default=None, type=int,
+      help='''stop the program after this many instructions (exit ''' +
+      '''code 16)''')
+
+  # --timeout
+  p.add_argument('--timeout', default=None, type=float,
+      help='''stop the program after this many seconds (exit code 17)''')
+
+  # --max-tape
+  p.add_argument('--max-tape', default=None, type=int,
+      help='''stop the program when its tape would grow over this ''' +
+      '''many cells (exit code 18)''')
+
+  # --profile
+  p.add_argument('--profile', action='store_true',
+      help='''count executions of instructions and loops, print report ''' +
+      '''(hottest loops by source offsets of [ and ]) to stderr''')
+
+  # --profile-json
+  p.add_argument('--profile-json', default=None, metavar='FILE',
+      help='''save the profile as JSON into FILE (- for stdout)''')
+
+  # --serve
+  p.add_argument('--serve', default=None, metavar='ADDR',
+      help='''run a session of the program for every client connected ''' +
+      '''to ADDR (PORT, HOST:PORT or path of a Unix socket)''')
+
+  # --connect
+  p.add_argument('--connect', default=None, metavar='ADDR',
+      help='''connect stdin and stdout to a session on server ADDR''')
+
+  # --daemon
+  p.add_argument('--daemon', default=None, metavar='PATH',
+      help='''serve runs of the command line (when $BF_DAEMON is the ''' +
+      '''socket PATH) with -w warm worker processes on Unix socket ''' +
+      '''PATH, the sources are compiled in advance''')
+
+  # --slice
+  p.add_argument('--slice', default=None, type=int,
+      help='''instructions a session executes before others may run ''' +
+      '''(default 10000)''')
+
+  # --checkpoint
+  p.add_argument('--checkpoint', default=None, metavar='FILE',
+      help='''save snapshots of the run into FILE (on SIGUSR1, SIGTERM ''' +
+      '''also stops the run with exit code 19)''')
+
+  # --checkpoint-steps
+  p.add_argument('--checkpoint-steps', default=None, type=int,
+      help='''also save a snapshot every this many instructions''')
+
+  # --checkpoint-interval
+  p.add_argument('--checkpoint-interval', default=None, type=float,
+      help='''also save a snapshot every this many seconds''')
+
+  # --resume
+  p.add_argument('--resume', default=None, metavar='FILE',
+      help='''continue the run saved in snapshot FILE (of the same ''' +
+      '''program and optimization level)''')
+
+  # -l / --left
+  p.add_argument('-l', '--left', action='store_true',
+      help='''grow the tape to the left instead of clamping the ''' +
+      '''pointer at cell 0''')
+
+  a = vars(p.parse_args())
+  if any(a[k] is not None and a[k] <= 0 for k in \
+         ('max_steps', 'timeout', 'max_tape', 'prefix', 'tier_threshold', \
+          'memo', 'memo_entries')):
+    p.error('limits must be positive')
+  if a['memo_entries'] is not None and a['memo'] is None:
+    p.error('--memo-entries needs --memo')
+  if a['memo'] is not None and a['engine'] != 'array':
+    p.error('--memo needs the array engine')
+  if a['repeat'] < 1 or a['threshold'] < 0:
+    p.error('repeat count must be positive, threshold not negative')
+  if a['slice'] is not None and a['slice'] < 1:
+    p.error('slice must be positive')
+  if a['lanes'] < 1:
+    p.error('lanes must be positive')
+  if any(a[k] is not None and a[k] <= 0 for k in \
+         ('checkpoint_steps', 'checkpoint_interval')):
+    p.error('checkpoint intervals must be positive')
+  if (a['checkpoint_steps'] or a['checkpoint_interval']) and \
+     not a['checkpoint']:
+    p.error('checkpoint intervals need --checkpoint')
+  if (a['checkpoint'] or a['resume']) and \
+     (a['profile'] or a['profile_json']):
+    p.error('profiled runs cannot be checkpointed or resumed')
+  if a['connect']:
+    return a
+  if a['daemon']:
+    if a['workers'] < 1:
+      p.error('worker count must be positive')
+    return a
+  if not a['source']:
+    p.error('the following arguments are required: source')
+  if not a['batch'] and not a['bench']:
+    if len(a['source']) > 1:
+      p.error('only one source can be run without --batch or --bench')
+    a['source'] = a['source'][0]
+  elif a['workers'] < 1 or a['chunksize'] < 1:
+    p.error('worker count and chunk size must be positive')
+  return a
 
 def exit_failure(code_, err_=None):
   ''' Exit with printing error message (if any) and correct exit code '''
 
-  ec = { "INVALID_CODE": 1,
-         "BF_PROCESS_INPUT": 10,
-         "BF_EXECUTE_CODE": 15,
-         "BL_DECODE_PNG": 20,
-         "BL_PROCESS_INPUT": 25,
-         "BC_DECODE_PNG": 30,
-         "BC_PROCESS_INPUT": 35 }
-
-  if code_ not in ec:
+  if code_ not in EXIT_CODES:
     code_ = "INVALID_CODE"
 
   if err_:
     print(err_)
 
-  exit(ec[code_])
+  exit(EXIT_CODES[code_])
 
 def create_error_msg(type_, value_, ignorable_=False):
   ''' Create and return error message in universal format '''
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Memory tapes for BrainFuck programs
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  Kinds:
+    flat   - one bytearray growing geometrically (default)
+    sparse - page table, pages of zero cells are never allocated
+    mmap   - memory mapped (anonymous or file backed) for huge tapes
+  Engines index .cells directly, cells between .low and .L are the
+  memory of the program, cells beyond .L are spare (always zero).
+  A tape created with left_=True grows to the left instead of clamping
+  the pointer at cell 0 (or failing in strict mode); spare cells in front
+  of the first cell that is not zero are then cut off from the result.
+  Tapes never grow over .cap cells, TapeLimitError is raised instead.
+'''
+
+# IMPORTS
+import std, sys, mmap
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+KINDS = ('flat', 'sparse', 'mmap')
+PAGE_BITS = 12 # sparse tape page is 4096 cells
+PAGE = 1 << PAGE_BITS
+MMAP_SIZE = 1 << 20 # initial size of memory mapped tape
+CHUNK = 65536 # cells checked at once by strided zero search
+
+######################### E - TAPE SIZE LIMIT ###########################
+class TapeLimitError(MemoryError):
+  ''' EXCEPTION: program needs more cells than the tape may have '''
+  pass
+
+################################# FLAT ##################################
+class Tape():
+  ''' Contiguous tape in a bytearray, geometric growth on both ends '''
+
+  kind = 'flat'
+
+  def __init__(self, data_=b'\x00', left_=False):
+    ''' Create tape holding data_ (at least one cell) '''
+
+    self.cells = self.alloc(data_ if len(data_) else b'\x00')
+    self.L = len(data_) if len(data_) else 1 # end of the program memory
+    self.low = 0 # start of the program memory
+    self.p = 0 # memory pointer (index into .cells)
+    self.left = left_ # grow to the left?
+    self.cap = sys.maxsize # max number of cells
+
+  def limit(self, n_):
+    ''' Raise TapeLimitError if the tape cannot have n_ cells '''
+
+    if n_ > self.cap:
+      raise TapeLimitError('tape limit of {0} cells exceeded'.format( \
+        self.cap))
+
+  def alloc(self, data_):
+    ''' Return new buffer holding data_ '''
+
+    return bytearray(data_)
+
+  def reserve(self, n_):
+    ''' Make first n_ cells addressable, return number of cells '''
+
+    c = len(self.cells)
+    if n_ > c:
+      self.limit(n_)
+      self.cells += bytes(min(max(n_, 2 * c), self.cap) - c)
+    return len(self.cells)
+
+  def shift(self, n_, L_):
+    ''' Add at least n_ cells in front of the tape whose end is L_,
+        return number of cells added (every index moves by it) '''
+
+    k = max(n_, min(L_, self.cap - L_)) # as much as the cap allows
+    self.limit(L_ + k)
+    self.cells[0:0] = bytes(k)
+    self.low += k
+    self.L = L_ + k
+    return k
+
+  def zero(self, p_, a_):
+    ''' Return index of first zero cell at p_, p_ + a_, ... or -1 '''
+
+    m = self.cells
+    if a_ == 1:
+      return m.find(b'\x00', p_)
+    if a_ == -1:
+      return m.rfind(b'\x00', 0, p_ + 1)
+    n = len(m)
+    while 0 <= p_ < n:
+      end = p_ + CHUNK * a_
+      s = m[p_:end if end >= 0 else None:a_]
+      q = s.find(0)
+      if q >= 0:
+        return p_ + q * a_
+      p_ += len(s) * a_
+    return -1
+
+  def first(self):
+    ''' Index where the program memory starts '''
+
+    s = min(self.low, self.p)
+    if not s:
+      return 0
+    head = bytes(self.cells[0:s])
+    return min(s, len(head) - len(head.lstrip(b'\x00')))
+
+  def load(self, data_, p_):
+    ''' Replace whole tape with data_, pointer p_ '''
+
+    self.cells[:] = data_
+    self.L = len(data_)
+    self.low = 0
+    self.p = p_
+
+  def memory(self):
+    ''' Return program memory and pointer into it '''
+
+    s = self.first()
+    del self.cells[self.L:] # no spare cells in the result
+    del self.cells[:s]
+    self.L -= s
+    self.low = 0
+    self.p -= s
+    return self.cells, self.p
+
+  def close(self):
+    ''' Release the tape (nothing to do for bytearray) '''
+
+    pass
+
+################################ SPARSE #################################
+class Pages():
+  ''' Cells of SparseTape, supports indexing just like bytearray '''
+
+  def __init__(self):
+    self.pages = dict() # page number -> bytearray(PAGE)
+
+  def __len__(self):
+    return sys.maxsize
+
+  def __getitem__(self, i_):
+    pg = self.pages.get(i_ >> PAGE_BITS)
+    return 0 if pg is None else pg[i_ & (PAGE - 1)]
+
+  def __setitem__(self, i_, v_):
+    pg = self.pages.get(i_ >> PAGE_BITS)
+    if pg is None:
+      if not v_:
+        return
+      pg = self.pages[i_ >> PAGE_BITS] = bytearray(PAGE)
+    pg[i_ & (PAGE - 1)] = v_
+
+class SparseTape(Tape):
+  ''' Tape in a page table, memory used only for pages touched '''
+
+  kind = 'sparse'
+
+  def alloc(self, data_):
+    ''' Return new buffer holding data_ '''
+
+    m = Pages()
+    self.store(m, data_, 0)
+    return m
+
+  def store(self, m_, data_, i_):
+    ''' Copy data_ into pages of m_ starting at cell i_ '''
+
+    for j in range(0, len(data_), PAGE):
+      for k in range(j, min(j + PAGE, len(data_))):
+        if data_[k]:
+          m_[i_ + k] = data_[k]
+
+  def reserve(self, n_):
+    ''' Every cell (up to the cap) is addressable '''
+
+    self.limit(n_)
+    return self.cap
+
+  def shift(self, n_, L_):
+    ''' Renumber pages to make room for at least n_ cells in front, pages
+        are split if the shift is not a whole number of them '''
+
+    k = max(n_, min(L_, self.cap - L_)) # as much as the cap allows
+    self.limit(L_ + k)
+    r = k & (PAGE - 1)
+    if not r:
+      pages = dict((n + (k >> PAGE_BITS), pg) for n, pg in \
+        self.cells.pages.items())
+    else:
+      pages = dict()
+      for n, pg in self.cells.pages.items():
+        j = n + (k >> PAGE_BITS)
+        pages.setdefault(j, bytearray(PAGE))[r:] = pg[:PAGE - r]
+        pages.setdefault(j + 1, bytearray(PAGE))[:r] = pg[PAGE - r:]
+    self.cells.pages = pages
+    self.low += k
+    self.L = L_ + k
+    return k
+
+  def zero(self, p_, a_):
+    ''' Return index of first zero cell at p_, p_ + a_, ... or -1 '''
+
+    pages = self.cells.pages
+    while p_ >= 0:
+      pg = pages.get(p_ >> PAGE_BITS)
+      if pg is None: # page never written, all its cells are zero
+        return p_
+      s = pg[p_ & (PAGE - 1)::a_]
+      q = s.find(0)
+      if q >= 0:
+        return p_ + q * a_
+      p_ += len(s) * a_
+    return -1
+
+  def first(self):
+    ''' Index where the program memory starts '''
+
+    s = min(self.low, self.p)
+    for n in sorted(self.cells.pages):
+      if n << PAGE_BITS >= s:
+        break
+      pg = self.cells.pages[n]
+      if pg.count(0) != PAGE:
+        return min(s, (n << PAGE_BITS) + len(pg) - len(pg.lstrip(b'\x00')))
+    return s
+
+  def load(self, data_, p_):
+    ''' Replace whole tape with data_, pointer p_ '''
+
+    self.cells.pages = dict()
+    self.store(self.cells, data_, 0)
+    self.L = len(data_)
+    self.low = 0
+    self.p = p_
+
+  def memory(self):
+    ''' Return program memory (materialized) and pointer into it '''
+
+    s = self.first()
+    ret = bytearray(self.L - s)
+    for n, pg in self.cells.pages.items():
+      i = (n << PAGE_BITS) - s
+      if i + PAGE > 0 and i < len(ret):
+        ret[max(i, 0):i + PAGE] = pg[max(-i, 0):len(ret) - i]
+    return ret, self.p - s
+
+################################# MMAP ##################################
+class MmapTape(Tape):
+  ''' Tape in memory mapped area (anonymous or backed by file path_) '''
+
+  kind = 'mmap'
+
+  def __init__(self, data_=b'\x00', left_=False, path_=None, \
+               size_=MMAP_SIZE):
+    ''' Create tape holding data_, map at least size_ cells '''
+
+    self.path = path_
+    self.size = max(size_, len(data_), 1)
+    self.file = None
+    Tape.__init__(self, data_, left_)
+
+  def alloc(self, data_):
+    ''' Return new mapping holding data_ '''
+
+    if self.path is None:
+      m = mmap.mmap(-1, self.size)
+    else:
+      self.file = open(self.path, 'w+b')
+      self.file.truncate(self.size)
+      m = mmap.mmap(self.file.fileno(), self.size)
+    m[0:len(data_)] = bytes(data_)
+    return m
+
+  def reserve(self, n_):
+    ''' Make first n_ cells addressable, return number of cells '''
+
+    self.limit(n_) # the first mapping may be larger than the cap
+    c = len(self.cells)
+    if n_ > c:
+      self.cells.resize(min(max(n_, 2 * c), self.cap)) # new cells are zero
+    return min(len(self.cells), self.cap)
+
+  def shift(self, n_, L_):
+    ''' Add at least n_ cells in front of the tape whose end is L_,
+        return number of cells added (every index moves by it) '''
+
+    k = max(n_, min(L_, self.cap - L_)) # as much as the cap allows
+    self.reserve(L_ + k)
+    self.cells.move(k, 0, L_)
+    for i in range(0, k, CHUNK):
+      self.cells[i:min(i + CHUNK, k)] = bytes(min(CHUNK, k - i))
+    self.low += k
+    self.L = L_ + k
+    return k
+
+  def first(self):
+    ''' Index where the program memory starts '''
+
+    s = min(self.low, self.p)
+    for i in range(0, s, CHUNK):
+      head = self.cells[i:min(i + CHUNK, s)]
+      if head.count(0) != len(head):
+        return i + len(head) - len(head.lstrip(b'\x00'))
+    return s
+
+  def load(self, data_, p_):
+    ''' Replace whole tape with data_, pointer p_ '''
+
+    self.reserve(len(data_))
+    self.cells[0:len(data_)] = bytes(data_)
+    for i in range(len(data_), self.L, CHUNK): # spare cells must be zero
+      self.cells[i:min(i + CHUNK, self.L)] = bytes(min(CHUNK, self.L - i))
+    self.L = len(data_)
+    self.low = 0
+    self.p = p_
+
+  def memory(self):
+    ''' Return program memory (view of the mapping) and pointer into it '''
+
+    s = self.first()
+    return memoryview(self.cells)[s:self.L], self.p - s
+
+  def close(self):
+    ''' Flush and unmap the tape '''
+
+    self.cells.flush()
+    self.cells.close()
+    if self.file is not None:
+      self.file.close()
+
+################################ HELPERS ################################
+def create(kind_='flat', data_=b'\x00', left_=False, path_=None, cap_=None):
+  ''' Create tape of kind_ holding data_, at most cap_ cells '''
+
+  if kind_ == 'flat':
+    t = Tape(data_, left_)
+  elif kind_ == 'sparse':
+    t = SparseTape(data_, left_)
+  elif kind_ == 'mmap':
+    t = MmapTape(data_, left_, path_)
+  else:
+    raise ValueError("unknown tape kind " + str(kind_))
+  if cap_ is not None:
+    t.cap = cap_
+  return t
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "TAPE can only be imported, not run!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Regression tests of the execution engines (run with pytest)
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+'''
+
+# IMPORTS
+import std, sys, pytest, brainx, bytecode, codegen
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+################################ HELPERS ################################
+def stopped(program_, **kw_):
+  ''' Run program_, return (memory, pointer, steps) of the run it failed '''
+
+  with pytest.raises(brainx.ExecutionError) as e:
+    program_.run(**kw_)
+  r = e.value.result
+  return bytes(r.memory), r.memory_pointer, r.steps
+
+################################## MEMO #################################
+@pytest.mark.parametrize('limit', [10, 100, 1000])
+def test_memo_limit_keeps_state(limit):
+  ''' A limit hit inside a memoized loop leaves the state of a plain run '''
+
+  src = '>>+[>+>+<<+]'
+  assert stopped(brainx.compile(src, memo_window=8), step_limit=limit) == \
+         stopped(brainx.compile(src), step_limit=limit)
+
+################################ PYTHON #################################
+@pytest.mark.parametrize('limit', [None, 10 ** 7])
+def test_python_long_straight_code(limit, monkeypatch):
+  ''' Straight code many times longer than codegen.MAX_LINES runs without
+      nesting a stack frame per piece of it '''
+
+  monkeypatch.setattr(codegen, 'MAX_LINES', 10) # pieces are cheap then
+  src = '+>' * (10 * sys.getrecursionlimit()) + '.'
+  p = brainx.compile(src, engine='python').run(step_limit=limit)
+  a = brainx.compile(src, engine='array').run(step_limit=limit)
+  assert (p.memory, p.memory_pointer, p.steps) == \
+         (a.memory, a.memory_pointer, a.steps if limit else None)
+
+############################### OPTIMIZER ###############################
+def test_level_0_rewrites_nothing():
+  ''' Level 0 only collapses runs, loops stay loops '''
+
+  code = brainx.compile('+[-]>+[<]', level=0).ir
+  assert not any(code.rewrites.values())
+  assert set(code.ops) <= {bytecode.ADD, bytecode.MOVE, bytecode.JZ, \
+                           bytecode.JNZ, bytecode.HALT}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+  Tiered execution of BrainFuck bytecode
+  Author: nzt4567; Mail: nzt4567@gmx.com; Year: 2012/2013
+
+  A run starts right away in the bytecode interpreter (tier 0) on a copy
+  of the program whose JNZ count iterations of every loop (JNZC). A loop
+  iterated THRESHOLD times is hot: its body alone is translated to Python
+  (see codegen) and its JZ becomes CALL of the compiled function (tier 1),
+  the run continues there at once, so even a loop entered only once runs
+  compiled for the rest of its iterations. Compiled loops are kept by the
+  program (Tiers), later runs call them from the start.
+  Instructions executed are counted exactly like in the interpreter.
+'''
+
+# IMPORTS
+import std, time, bytecode, codegen
+from array import array
+from bytecode import Bytecode, HALT, JNZ, CALL, JNZC, Suspend
+
+# CREDITS
+__author__  = std.__author__
+__email__   = std.__email__
+__status__  = std.__status__
+__version__ = std.__version__
+__license__ = std.__license__
+__year__    = std.__year__
+
+THRESHOLD = 1000 # iterations making a loop hot
+TOP = 20 # compiled loops listed in the report
+
+################################# TIERS #################################
+class Tiers():
+  ''' Loops of a program compiled so far and statistics of its runs '''
+
+  def __init__(self, threshold_=THRESHOLD):
+    if threshold_ < 1:
+      raise ValueError("tier threshold must be positive")
+    self.threshold = threshold_
+    self.compiled = dict() # Bytecode -> {index of JZ: PyProgram}
+    self.loops = dict() # (source offsets of [ and ]) -> [calls, hot at]
+    self.runs = 0
+    self.seconds = 0.0 # spent compiling loops
+
+  def compile(self, code_, jz_):
+    ''' Return PyProgram of the loop of Bytecode code_ starting at jz_ '''
+
+    loops = self.compiled.setdefault(code_, dict())
+    if jz_ not in loops:
+      s = time.perf_counter()
+      end = code_.args[jz_] # behind its JNZ
+      sub = Bytecode()
+      sub.ops = code_.ops[jz_:end]
+      sub.args = code_.args[jz_:end]
+      sub.offs = code_.offs[jz_:end]
+      sub.src = code_.src[jz_:end]
+      sub.emit(HALT, 0, code_.src[end - 1])
+      sub.clamp = code_.clamp
+      loops[jz_] = codegen.translate(sub, True)
+      self.seconds += time.perf_counter() - s
+    return loops[jz_]
+
+  def report(self, top_=TOP):
+    ''' Return human readable statistics, top_ most called loops '''
+
+    ret = ['tiered: threshold {0}, {1} loops compiled in {2:.3f} s, {3} '
+           'runs'.format(self.threshold, sum(len(l) for l in \
+           self.compiled.values()), self.seconds, self.runs),
+           'compiled loops (by calls, source offsets of [ and ]):']
+    hot = sorted(self.loops.items(), key=lambda l: (-l[1][0], l[0]))
+    for (b, e), (calls, at) in hot[:top_]:
+      ret.append('  [{0:>7} ]{1:>7} {2:>12} calls, hot after {3} '
+                 'instructions'.format(b, e, calls, '-' if at is None else at))
+    if len(hot) > top_:
+      ret.append('  ... {0} more'.format(len(hot) - top_))
+    return '\n'.join(ret)
+
+################################ TIER 0 #################################
+def tier0(code_, threshold_):
+  ''' Return copy of Bytecode code_ counting iterations of its loops '''
+
+  ret = Bytecode()
+  ret.ops = array('i', code_.ops)
+  ret.args = array('i', code_.args)
+  ret.offs = code_.offs
+  ret.src = code_.src
+  ret.clamp = code_.clamp
+  ret.hits = array('i', [0]) * len(code_) # iterations until hot, calls
+  ret.calls = list() # [compiled loop, index behind it, JZ] of CALL
+  for i in range(0, len(code_)):
+    if code_.ops[i] == JNZ:
+      ret.ops[i] = JNZC
+      ret.hits[i] = threshold_
+  return ret
+
+def bind(run_, jz_, prog_, env_):
+  ''' Make JZ at jz_ of tier 0 code run_ call compiled PyProgram prog_
+      (with runtime helpers env_) '''
+
+  env = dict(env_)
+  exec(prog_.code, env)
+  run_.calls.append([env['_bf_main'], run_.args[jz_], jz_])
+  run_.ops[jz_] = CALL
+  run_.args[jz_] = len(run_.calls) - 1
+
+############################### EXECUTION ###############################
+def execute(code_, tape_, out_, in_, check_=None, tiers_=None):
+  ''' Run Bytecode code_ on tape.Tape tape_, hot loops compiled by (and
+      kept in) Tiers tiers_; return number of instructions executed,
+      limits are checked by check_ (see bytecode.budget) '''
+
+  tiers = tiers_ if tiers_ is not None else Tiers()
+  check = check_ if check_ is not None else bytecode.budget()
+  env = codegen.helpers(tape_, code_.clamp, check)
+  run = tier0(code_, tiers.threshold)
+  for jz, prog in tiers.compiled.get(code_, dict()).items():
+    bind(run, jz, prog, env)
+  hot = dict() # JZ -> instructions executed when it got hot
+
+  ip = n = 0 # where the run continues
+  try:
+    while 1:
+      try:
+        return bytecode.execute(run, tape_, out_, in_, check, ip, n)
+      except Suspend as e:
+        if e.reason != 'hot':
+          raise
+        jz = e.ip - 1 # its body was about to be run again ...
+        hot[jz] = e.steps
+        bind(run, jz, tiers.compile(code_, jz), env)
+        ip, n = jz, e.steps - 1 # ... so run the loop (CALL counts as JZ)
+  finally:
+    tiers.runs += 1
+    for f, end, jz in run.calls:
+      l = tiers.loops.setdefault((code_.src[jz], code_.src[end - 1]), \
+                                 [0, None])
+      l[0] += run.hits[jz]
+      if jz in hot:
+        l[1] = hot[jz]
+
+################################# MAIN ##################################
+if __name__ == '__main__':
+  std.exit_failure("INVALID_CODE", "TIERED can only be imported, not run!")